@@ -1,106 +1,66 @@
+import heapq
 import numpy as np
 
-
-class Node:
-    """A node class for A* Pathfinding"""
-
-    def __init__(self, parent=None, position=None):
-        self.parent = parent
-        self.position = position
-
-        self.g = 0
-        self.h = 0
-        self.f = 0
-
-    def __eq__(self, other):
-        return np.array_equal(self.position, other.position)
+# Adjacent squares, in the order children are expanded
+MOVES = ((0, -1), (0, 1), (-1, 0), (1, 0))
 
 
 def astar(maze, start, end, wall=1):
-    """Returns a list of tuples as a path from the given start to the given end in the given maze"""
-
-    # Create start and end node
-    start_node = Node(None, start)
-    start_node.g = start_node.h = start_node.f = 0
-    end_node = Node(None, end)
-    end_node.g = end_node.h = end_node.f = 0
-
-    # Initialize both open and closed list
-    open_list = []
-    closed_list = []
-
-    # Add the start node
-    open_list.append(start_node)
+    """Returns a list of positions as a path from the given start to the given end in the given maze"""
+    width, height = maze.shape[0], maze.shape[1]
+    start_x, start_y = int(start[0]), int(start[1])
+    end_x, end_y = int(end[0]), int(end[1])
+    end_key = end_x * height + end_y
+
+    # Flat bitmaps over the grid, each cell keyed by x * height + y
+    blocked = (np.asarray(maze) // 10 * 10 == wall).ravel()
+    closed = np.zeros(width * height, dtype=bool)
+    parent = dict()
+
+    # Open set as a binary heap of (f, order, g, cell, parent cell),
+    # the insertion order breaks ties so the earliest entry is expanded first
+    order = 0
+    open_heap = [(0, order, 0, start_x * height + start_y, -1)]
 
     # Loop until you find the end
-    while len(open_list) > 0:
+    while open_heap:
 
-        # Get the current node
-        current_node = open_list[0]
-        current_index = 0
-        for index, item in enumerate(open_list):
-            if item.f < current_node.f:
-                current_node = item
-                current_index = index
-
-        # Pop current off open list, add to closed list
-        open_list.pop(current_index)
-        closed_list.append(current_node)
+        # Pop the entry with the lowest f, skip stale duplicates
+        _, _, g, key, parent_key = heapq.heappop(open_heap)
+        if closed[key]:
+            continue
+        closed[key] = True
+        parent[key] = parent_key
 
         # Found the goal
-        # print(current_node.position, end_node.position)
-        if current_node == end_node:
+        if key == end_key:
             path = []
-            current = current_node
-            while current is not None:
-                path.append(current.position)
-                current = current.parent
+            while key != -1:
+                path.append(np.array(divmod(key, height)))
+                key = parent[key]
             return path[::-1]  # Return reversed path
 
         # Generate children
-        children = []
-        for new_position in [np.array([0, -1]), np.array([0, 1]), np.array([-1, 0]), np.array([1, 0])]:  # Adjacent squares
-
-            # Get node position
-            node_position = current_node.position + new_position
+        x, y = divmod(key, height)
+        for dx, dy in MOVES:
+            child_x, child_y = x + dx, y + dy
 
             # Make sure within range
-            if node_position[0] >= maze.shape[0] or node_position[0] < 0 or node_position[1] >= maze.shape[1] or node_position[1] < 0:
+            if child_x >= width or child_x < 0 or child_y >= height or child_y < 0:
                 continue
 
-            # Make sure walkable terrain
-            if maze[node_position[0], node_position[1]] // 10 * 10 == wall:
+            # Make sure walkable terrain and not on the closed set
+            child_key = child_x * height + child_y
+            if blocked[child_key] or closed[child_key]:
                 continue
 
-            # Create new node
-            new_node = Node(current_node, node_position)
-
-            # Append
-            children.append(new_node)
-
-        # Loop through children
-        for child in children:
-
-            # Child is on the closed list
-            is_closed = False
-            for closed_child in closed_list:
-                if child == closed_child:
-                    is_closed = True
-            if is_closed: continue
-
             # Create the f, g, and h values
-            child.g = current_node.g + 1
-            child.h = ((child.position[0] - end_node.position[0]) ** 2) + (
-                        (child.position[1] - end_node.position[1]) ** 2)
-            child.f = child.g + child.h
-
-            # Child is already in the open list
-            for open_node in open_list:
-                if child == open_node and child.g > open_node.g:
-                    continue
-
-            # Add the child to the open list
-            open_list.append(child)
+            child_g = g + 1
+            child_h = (child_x - end_x) ** 2 + (child_y - end_y) ** 2
+
+            # Add the child to the open set
+            order += 1
+            heapq.heappush(open_heap, (child_g + child_h, order, child_g, child_key, key))
 
 
 def main():
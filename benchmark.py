@@ -1,9 +1,11 @@
 from hierarchy_endpoint import Controller
+from profiler import LatencyHistogram
+import numpy as np
 import time
-import matplotlib.pyplot as plt
 
 NUM_SIM = 200
 NUM_ITER = 100
+EXCLUDED = [1, 2, 3, 4, 5, 6, 7, 8, 9, 10, 52, 53, 54, 55, 56, 57, 58, 59, 60, 61, 62]
 PALLETS = {
     '001': [2, 0],
     '002': [3, 0],
@@ -86,120 +88,196 @@ PALLETS = {
     '079': [50, 6],
     '080': [51, 6],
 }
+CONTROLLERS = dict()  # Controller of each configuration, reused by the simulations of the process
 
 
-def init_scene(controller, pallet_num):
-    from random import sample
-    # print(PALLETS.values(), type(PALLETS.values()))
-    for pallet in sample(list(PALLETS.values()), pallet_num):
-        x, y = pallet[0], pallet[1]
-        if x is not None and y is not None:
-            controller.add_pallet(x, y)
-        else:
-            controller.add_pallet()
+def init_scene(controller, pallet_num, rng=None, seed=None):
+    """
+    Start a new episode with pallets on randomly chosen initial positions.
+    :param rng: random.Random, source of the choice, the random module if None.
+    :param seed: integer, seed of the new random stream of the controller, None to keep drawing from its stream.
+    :return: list, ID of each pallet.
+    """
+    import random
+    rng = random if rng is None else rng
+    return controller.reset(rng.sample(list(PALLETS.values()), pallet_num), seed=seed)
 
 
-def run(controller):
-    data = {'occupied': [],
-            'capacity': controller.get_capacity()}
-    for _ in range(NUM_ITER):
+def run(controller, latency=None):
+    """
+    :param latency: LatencyHistogram, recording the computation time of each update, if given.
+    :return: dict, with ID of each node in V as 'nodes', its capacity as 'capacity',
+        and its occupation after each update as rows of 'occupied'.
+    """
+    capacity = controller.get_capacity()
+    data = {'nodes': np.array([node for node, _ in capacity]),
+            'capacity': np.array([cap for _, cap in capacity], dtype=float),
+            'occupied': np.zeros((NUM_ITER, len(capacity)), dtype=np.int32)}
+    for t in range(NUM_ITER):
+        st = time.perf_counter()
         controller.update()
-        data['occupied'].append(controller.get_occupied())
+        if latency is not None:
+            latency.record(time.perf_counter() - st)
+        controller.record_occupied(data['occupied'][t])
     return data
 
 
-def dl_analysis(history):
-    data = []
-    for path in history:
-        arr = []
-        i = 1
-        delay = 0
-        while i < len(path):
-            if path[i - 1] == path[i]:
-                delay += 1
-            elif delay > 0:
-                arr.append(delay)
-                delay = 0
-            i += 1
-        if len(arr) > 0:
-            data.append(arr)
-
-    max_delay = max([max(arr) for arr in data]) if len(data) > 0 else 0
-    total_delay = sum([sum(arr) for arr in data]) if len(data) > 0 else 0
-    robots = len(data)
-    avg_delay = sum([sum(arr) / len(arr) for arr in data]) / robots if len(data) > 0 else 0
+def dl_analysis(trajectory):
+    """
+    Analyze the waits of each pallet, a wait counting once the pallet moves again.
+    :param trajectory: array, (T, P) ID of node in G of each pallet at each step, -1 before it was added.
+    :return: tuple, longest wait, total wait, average over delayed pallets of their average wait,
+        and number of delayed pallets.
+    """
+    trajectory = np.asarray(trajectory)
+    waiting = (trajectory[1:] == trajectory[:-1]) & (trajectory[:-1] != -1)
+
+    # Length of the wait ending at each step, as the distance to the last step without waiting
+    steps = np.arange(len(waiting))[:, None]
+    last_moved = np.maximum.accumulate(np.where(waiting, -1, steps), axis=0)
+    length = steps - last_moved
+
+    # Waits ended by a move
+    ended = waiting[:-1] & ~waiting[1:]
+    delays = np.where(ended, length[:-1], 0)
+    count = ended.sum(axis=0)
+    delayed = count > 0
+    if not delayed.any():
+        return 0, 0, 0, 0
+
+    max_delay = int(delays.max())
+    total_delay = int(delays.sum())
+    robots = int(delayed.sum())
+    avg_delay = float((delays.sum(axis=0)[delayed] / count[delayed]).sum() / robots)
     return max_delay, total_delay, avg_delay, robots
 
 
 def occupation_analysis(data):
-    excluded = [1, 2, 3, 4, 5, 6, 7, 8, 9, 10, 52, 53, 54, 55, 56, 57, 58, 59, 60, 61, 62]
-    cap, occ = list(data['capacity']), data['occupied']
-    # print(dict(occ[0]))
-    lst = sorted([round(dict(o)[i + 1] / cap[i][1] * 100, 3)
-                  for o in occ for i in range(len(cap)) if i + 1 not in excluded])
-    lst = [x for x in lst if x > 0]
-    first_quart = lst[len(lst) // 4]
-    mean = lst[len(lst) // 2]
-    third_quart = lst[3 * len(lst) // 4]
-    avg = round(sum(lst) / len(lst), 3)
+    """
+    Analyze the occupation ratio of the nodes in V outside EXCLUDED over all steps, empty nodes left out.
+    :param data: dict, as returned by run.
+    :return: tuple, first quartile, median, third quartile and average of the ratios in percent.
+    """
+    included = ~np.isin(data['nodes'], EXCLUDED)
+    ratios = np.round(data['occupied'][:, included] / data['capacity'][included] * 100, 3).ravel()
+    ratios = ratios[ratios > 0]
+    quarts = [len(ratios) // 4, len(ratios) // 2, 3 * len(ratios) // 4]
+    first_quart, mean, third_quart = np.partition(ratios, quarts)[quarts].tolist()
+    avg = round(float(ratios.mean()), 3)
     return first_quart, mean, third_quart, avg
 
 
+def simulate(seed, windows, gain, roadmap, topology, origin, pallet_num):
+    """
+    Run one simulation from its own seed, so any run can be reproduced alone.
+    The Controller of each configuration is built once per process and reset for every simulation.
+    :return: tuple, computation time, delay analysis, occupation analysis and LatencyHistogram of the updates.
+    """
+    import random
+    rng = random.Random(seed)
+
+    key = (windows, gain, roadmap, topology, origin)
+    if key not in CONTROLLERS:
+        CONTROLLERS[key] = Controller(H=windows, K=gain, roadmap=roadmap, topology=topology, origin=origin)
+    cont = CONTROLLERS[key]
+
+    # The controller draws from its own stream, so the same seed gives the same scene and the same
+    # workstation orders under any H and K
+    controller_seed = rng.getrandbits(64)
+    init_scene(cont, pallet_num, rng, controller_seed)
+    latency = LatencyHistogram()
+    st = time.time()
+    occ_data = run(cont, latency)
+    et = time.time()
+    return et - st, dl_analysis(cont.get_trajectory()), occupation_analysis(occ_data), latency
+
+
+def run_parallel(seeds, processes=None, **params):
+    """
+    Fan the simulations out over a process pool.
+    Results are yielded in the order of the seeds, each as it is ready.
+    :param seeds: list, seed of each simulation.
+    :param processes: integer, number of worker processes, all cores if None.
+    :param params: keyword arguments of simulate.
+    """
+    from functools import partial
+    from multiprocessing import Pool
+
+    with Pool(processes) as pool:
+        yield from pool.imap(partial(simulate, **params), seeds)
+
+
+def summarize(result, dl_summary, occ_summary, pallet_num, windows, gain, roadmap, topology, comment,
+              latency=None):
+    """
+    Merge the results of all simulations, in the order of their seeds, into the benchmark summary.
+    :param latency: LatencyHistogram, merged over all simulations, the step latency is omitted if None.
+    :return: string, summary.
+    """
+    num_sim = len(result)
+    steps = ''
+    if latency is not None:
+        steps = f'Step latency p50 / p95 / p99 / max: {latency.percentile(50):.3f} / {latency.percentile(95):.3f} / ' \
+                f'{latency.percentile(99):.3f} / {latency.get_max():.3f} \n' \
+                f'Deadline misses (> {latency.get_deadline():.3f}s): {latency.get_misses()} / {latency.get_count()} \n'
+    return f'Number of simulations: {num_sim} \n' \
+           f'Number of iterations: {NUM_ITER} \n' \
+           f'Number of pallets: {pallet_num} \n' \
+           f'Parameters: H = {windows}, K = {gain} \n' \
+           f'Maximum computation time: {max(result):.3f} / {NUM_ITER} ({max(result) / NUM_ITER:.3f})\n' \
+           f'Minimum computation time: {min(result):.3f} / {NUM_ITER} ({min(result) / NUM_ITER:.3f})\n' \
+           f'Average computation time: {sum(result) / num_sim:.3f} / {NUM_ITER} ({sum(result) / num_sim / NUM_ITER:.3f})\n' \
+           f'Mean computation time: {sorted(result)[len(result) // 2]:.3f} \n' \
+           f'{steps}' \
+           f'Maximum delay on a pallet: {max([dl[0] for dl in dl_summary])} \n' \
+           f'Average delay for each pallet: {sum([dl[2] for dl in dl_summary]) / num_sim:.3f} \n' \
+           f'Average total delay of each simulation: {sum([dl[1] for dl in dl_summary]) // num_sim}\n' \
+           f'Average number of robots delayed: {sum([dl[3] for dl in dl_summary]) // num_sim}\n' \
+           f'Average occupation: {sum(occ_summary["avg"]) / num_sim:.3f}\n' \
+           f'First quartile occupation: {sum(occ_summary["first_quart"]) / num_sim:.3f}\n' \
+           f'Mean occupation: {sum(occ_summary["mean"]) / num_sim:.3f}\n' \
+           f'Third quartile occupation: {sum(occ_summary["third_quart"]) / num_sim:.3f}\n' \
+           f'Files used: {roadmap}, {topology} \n' \
+           f'{comment}\n'
+
+
 if __name__ == '__main__':
     result = []
     dl_summary = []
     occ_summary = {'first_quart': [], 'mean': [], 'third_quart': [], 'avg': []}
+    latency = LatencyHistogram()
     roadmap = 'hex_roadmap4.json'
     topology = 'hex_topology4.json'
     comment = 'Origin.'
     windows = 1
     gain = 10
     pallet_num = 80
+    base_seed = 0
+    seeds = [base_seed + i for i in range(NUM_SIM)]
 
-    for i in range(NUM_SIM):
-        cont = Controller(H=windows, K=gain, roadmap=roadmap, topology=topology, origin=True)
-        init_scene(cont, pallet_num)
-        st = time.time()
-        occ_data = run(cont)
-        et = time.time()
-        result.append(et - st)
-        hist = cont.get_history()
-        max_delay, total_delay, avg_delay, robots = dl_analysis(hist)
-        dl_summary.append([max_delay, total_delay, avg_delay, robots])
-        first_quart, mean, third_quart, avg = occupation_analysis(occ_data)
+    runs = run_parallel(seeds, windows=windows, gain=gain, roadmap=roadmap, topology=topology, origin=True,
+                        pallet_num=pallet_num)
+    for i, (elapsed, dl, occ, steps) in enumerate(runs):
+        result.append(elapsed)
+        latency.merge(steps)
+        dl_summary.append(list(dl))
+        first_quart, mean, third_quart, avg = occ
         occ_summary['first_quart'].append(first_quart)
         occ_summary['mean'].append(mean)
         occ_summary['third_quart'].append(third_quart)
         occ_summary['avg'].append(avg)
-        del cont
-        print(f"Round {i + 1}th ended: {et - st:.3f}s, avg. delay: {avg_delay:.3f}, avg. occupation: {avg:.3f} \n"
+        print(f"Round {i + 1}th (seed {seeds[i]}) ended: {elapsed:.3f}s, avg. delay: {dl[2]:.3f}, "
+              f"avg. occupation: {avg:.3f} \n"
               f"Preparing new round...", end='\r')
 
-    summary = f'Number of simulations: {NUM_SIM} \n' \
-              f'Number of iterations: {NUM_ITER} \n' \
-              f'Number of pallets: {pallet_num} \n' \
-              f'Parameters: H = {windows}, K = {gain} \n' \
-              f'Maximum computation time: {max(result):.3f} / {NUM_ITER} ({max(result) / NUM_ITER:.3f})\n' \
-              f'Minimum computation time: {min(result):.3f} / {NUM_ITER} ({min(result) / NUM_ITER:.3f})\n' \
-              f'Average computation time: {sum(result) / NUM_SIM:.3f} / {NUM_ITER} ({sum(result) / NUM_SIM / NUM_ITER:.3f})\n' \
-              f'Mean computation time: {sorted(result)[len(result) // 2]:.3f} \n' \
-              f'Maximum delay on a pallet: {max([dl[0] for dl in dl_summary])} \n' \
-              f'Average delay for each pallet: {sum([dl[2] for dl in dl_summary]) / NUM_SIM:.3f} \n' \
-              f'Average total delay of each simulation: {sum([dl[1] for dl in dl_summary]) // NUM_SIM}\n' \
-              f'Average number of robots delayed: {sum([dl[3] for dl in dl_summary]) // NUM_SIM}\n' \
-              f'Average occupation: {sum(occ_summary["avg"]) / NUM_SIM:.3f}\n' \
-              f'First quartile occupation: {sum(occ_summary["first_quart"]) / NUM_SIM:.3f}\n' \
-              f'Mean occupation: {sum(occ_summary["mean"]) / NUM_SIM:.3f}\n' \
-              f'Third quartile occupation: {sum(occ_summary["third_quart"]) / NUM_SIM:.3f}\n' \
-              f'Files used: {roadmap}, {topology} \n' \
-              f'{comment}\n'
+    summary = summarize(result, dl_summary, occ_summary, pallet_num, windows, gain, roadmap, topology, comment,
+                        latency)
 
     print(f'Finished!\n{summary}')
 
     with open("benchmarking.txt", 'a') as f:
-        f.write(f"\n{summary}Data: \n{result}\n")
+        f.write(f"\n{summary}Seeds: {seeds[0]} to {seeds[-1]} \nData: \n{result}\n")
+
+    import plots
 
-    plt.hist(result, bins=int(max(result) - min(result)))
-    plt.ylabel('% run ended')
-    plt.xlabel('Time (s)')
-    plt.show()
+    plots.time_histogram(result)
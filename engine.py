@@ -0,0 +1,63 @@
+import time
+import numpy as np
+
+
+def simulate(controller_class, scene, steps, **params):
+    """
+    Run a scene at full speed without any visualization.
+    Only the controller and its graph core are loaded, no PyQt or matplotlib.
+
+    :param controller_class: class, Controller of hierarchy_endpoint or policy_endpoint.
+    :param scene: list, each element as initial x and y of a pallet, None for the default feeding position.
+    :param steps: integer, number of updates to run.
+    :param params: keyword arguments passed to the controller.
+    :return: dict, with
+        'pallets': list, ID of pallet of each column,
+        'position': array, (steps + 1, P, 2) x and y of each pallet before the first and after each update,
+        'occupied': array, (steps + 1, |V|) occupation of each node in V, None if the controller has no topology,
+        'capacity': array, (|V|,) capacity of each node in V, None if the controller has no topology,
+        'time': array, (steps,) computation time of each update in seconds,
+        'profile': dict, phase durations and counters of each update if the controller was created with
+            profile=True, None otherwise.
+    """
+    controller = controller_class(**params)
+    controller.add_pallets([position if position is not None and None not in position else None
+                            for position in scene])
+
+    pallets = list(controller.get_all_pallets().keys())
+    topology = hasattr(controller, 'get_occupied')
+    position = np.zeros((steps + 1, len(pallets), 2), dtype=np.int32)
+    occupied = np.zeros((steps + 1, len(controller.get_occupied())), dtype=np.int32) if topology else None
+    capacity = np.array([c for _, c in controller.get_capacity()]) if topology else None
+    timing = np.zeros(steps)
+
+    for t in range(steps + 1):
+        # Record the state reached by the previous update
+        state = controller.get_all_pallets()
+        position[t] = np.array([[state[pallet_id]['x'], state[pallet_id]['y']] for pallet_id in pallets],
+                               dtype=np.int32).reshape(-1, 2)
+        if topology:
+            controller.record_occupied(occupied[t])
+        if t == steps:
+            break
+
+        st = time.perf_counter()
+        controller.update()
+        timing[t] = time.perf_counter() - st
+
+    return {'pallets': pallets,
+            'position': position,
+            'occupied': occupied,
+            'capacity': capacity,
+            'time': timing,
+            'profile': controller.get_profile() if hasattr(controller, 'get_profile') else None}
+
+
+if __name__ == '__main__':
+    from hierarchy_endpoint import Controller
+    from benchmark import PALLETS
+    import random
+
+    result = simulate(Controller, random.sample(list(PALLETS.values()), 80), 100, H=1, K=10., origin=True)
+    print(f"{len(result['pallets'])} pallets, {len(result['time'])} steps in {result['time'].sum():.3f}s, "
+          f"max step {result['time'].max():.3f}s, peak occupation {result['occupied'].max()}")
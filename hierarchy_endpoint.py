@@ -1,9 +1,8 @@
-from hierarchy_repository import SceneSetup, Pallet, Workstation
-from copy import deepcopy
+from hierarchy_repository import SceneSetup, Scene, Fleet, Workstation, TimeWindow, History
+from profiler import StepProfiler, NullProfiler
+from tracer import Tracer
+import hierarchy_graph
 import random
-import logging
-import networkx as nx
-import matplotlib.pyplot as plt
 import numpy as np
 
 
@@ -15,33 +14,24 @@ class Controller:
     or import the TCP client for interacting with actual models.
     """
 
-    def __init__(self, topology='hex_topology4.json', roadmap='hex_roadmap4.json', H=1, K=10., origin=True):
+    def __init__(self, topology='hex_topology4.json', roadmap='hex_roadmap4.json', H=1, K=10., origin=True,
+                 seed=None, rng=None, profile=False, history=None, trace=Tracer.DEFAULT):
         """
         Initialize the Controller.
         Load up the Workspace Configuration.
         Load up the Topological and Roadmap Graph.
+
+        :param seed: integer, seed of the own random generator of the Controller, ignored if rng is given.
+        :param rng: random.Random or numpy Generator, source of all stochastic decisions,
+            a seeded reset giving a new stream of the same kind.
+        :param profile: boolean, whether to record the duration of each phase and the counters of each step.
+        :param history: integer, number of last steps kept in the history, None to keep every step.
+        :param trace: iterable, name of each category of Tracer recorded in the trace.
         """
-        logging.basicConfig(filename='last_log.txt', filemode='w', level=logging.DEBUG,
-                            format='%(asctime)s - %(levelname)s - %(message)s',
-                            datefmt='%d-%b-%y %H:%M:%S')
-
-        # Load the Workspace configuration
-        self.__workspace = SceneSetup.workspace
-        for wall in SceneSetup.wall:
-            x, y, w, h = wall
-            self.__workspace[x:x + w, y:y + h] = SceneSetup.WALL
-        for ws in SceneSetup.workstation:
-            x, y, w, h = ws
-            self.__workspace[x:x + w, y:y + h] = SceneSetup.WORKSTATION
-
-        # Update information of parking slot and queueing slot
-        for ps in SceneSetup.parking_slot:
-            x, y = ps
-            self.__workspace[x, y] = SceneSetup.PARK
-        for ws in SceneSetup.queueing_slot:
-            for qs in ws:
-                x, y = qs
-                self.__workspace[x, y] = SceneSetup.QUEUEING
+        self.__tracer = Tracer(trace)
+
+        # Own scene over the shared layout of the Workspace configuration
+        self.__scene = Scene()
 
         # Initiate the graph and properties
         self.topology__ = topology
@@ -49,69 +39,56 @@ class Controller:
         self.__init_graph()
         self.__H = H
         self.__K = K
-        self.__hist_V = []
+        self.__consensus = hierarchy_graph.Consensus(self.__V, K)
+        self.__window = TimeWindow(H, len(self.__G), len(self.__V), self.__G.distance)
+        self.__history = History(len(self.__V), history)
+        self.__trees = dict()
+        self.__corridors = dict()
         self.__unexpected_event = False
         self.__idle_step = 0
         self.__origin = origin
+        self.__random = rng if rng is not None else random.Random(seed)
+        self.__profiler = StepProfiler() if profile else NullProfiler()
 
         # Common memory allocation
+        self.__fleet = Fleet(headroom=2 * H)
         self.__pallets = dict()
+        self.__next_id = 1
         self.__workstations = dict()
         self.__add_workstations()
-        self.__logger = []
 
     def __init_graph(self):
         """
         Import topology and roadmap configuration.
         """
-        self.__G = nx.DiGraph(dim=(59, 7))
-        self.__V = nx.DiGraph(dim=(59, 7))
-        import json
-
-        # Create topology graph
-        with open(f"graphs/{self.topology__}", 'r') as f:
-            g = json.load(f)
-            self.__V.add_nodes_from([node["node"] for node in g], )
-            self.__V.add_weighted_edges_from([(node['node'], node['neighbor'][i], node['distance'][i])
-                                              for node in g for i in range(len(node['neighbor']))])
-            for e in self.__V.edges:
-                self.__V.edges[e[0], e[1]]['distance'] = self.__V.edges[e[0], e[1]]['weight']
-            for n in g:
-                self.__V.nodes[n['node']]['sub'] = []
-                self.__V.nodes[n['node']]['capacity'] = n['capacity']
-                self.__V.nodes[n['node']]['occupied'] = 0
-                self.__V.nodes[n['node']]['weight'] = 0
-
-            self.__V_laplacian = nx.to_numpy_array(self.__V)
-            for i, row in enumerate(self.__V_laplacian):
-                row[i] = -sum(row)
-                row *= -1
-            # print(self.__V_laplacian)
-
-        # Create roadmap graph
-        with open(f"graphs/{self.roadmap__}", 'r') as f:
-            g = json.load(f)
-            self.__G.add_nodes_from([node["node"] for node in g])
-            self.__G.add_weighted_edges_from([(node['node'], node['neighbor'][i], node['distance'][i])
-                                              for node in g for i in range(len(node['neighbor']))])
-            for n in g:
-                node_id = n['node']
-                self.__V.nodes[node_id // 100]['sub'].append(node_id)
-                self.__G.nodes[node_id]['node'] = node_id
-                self.__G.nodes[node_id]['occupied'] = 0
-                self.__G.nodes[node_id]['position'] = n['position']
-                self.__G.nodes[node_id]['host'] = node_id // 100
-
-            self.__G_weighted_edges = [edge for edge in self.__G.edges if edge[0] // 100 != edge[1] // 100]
-
-        # Extended Graph declaration
-        self.__ext_G = []
-        self.__ext_V = []
-
-    def __log(self, s):
-        if len(self.__logger) > 15:
-            self.__logger.pop(0)
-        self.__logger.append(s)
+        self.__V, self.__G = hierarchy_graph.load(self.topology__, self.roadmap__)
+
+        # Dense indexing of nodes for the time windows and searches
+        self.__g_nodes = self.__G.nodes.tolist()
+        self.__v_nodes = self.__V.nodes.tolist()
+        self.__g_index = self.__G.index
+        self.__host = self.__G.host
+        self.__g_host = self.__G.host.tolist()
+        self.__g_dense = np.full(self.__G.nodes.max() + 1, -1, dtype=int)
+        self.__g_dense[self.__G.nodes] = np.arange(len(self.__G))
+
+        # Edges crossing sectors, weighted by the sector they lead into
+        self.__G_weighted_edges = self.__G.crossing
+        self.__G_weighted_hosts = self.__host[self.__G.indices[self.__G_weighted_edges]]
+
+        # Workstation covering each cell, the first one in order if several do
+        self.__ws_names = list(SceneSetup.workstation_index.keys())
+        self.__ws_grid = np.full((SceneSetup.ws_width, SceneSetup.ws_height), -1, dtype=int)
+        for i, name in reversed(list(enumerate(self.__ws_names))):
+            x, y, w, h = SceneSetup.workstation[SceneSetup.workstation_index[name]]
+            self.__ws_grid[x:x + w, y:y + h] = i
+
+        # Node in G at the entry of each workstation, if any
+        self.__ws_entry = dict()
+        for name in self.__ws_names:
+            g = int(self.__G.locate(*SceneSetup.robot[name]['entry']))
+            if g != -1:
+                self.__ws_entry[name] = self.__g_nodes[g]
 
     def __add_workstations(self):
         """
@@ -120,59 +97,26 @@ class Controller:
         for ws_name in SceneSetup.workstation_index.keys():
             self.__workstations[ws_name] = Workstation(ws_name)
 
-    def __find_workstation(self, pos_x, pos_y):
-        """
-        Check which workstation contains the input coordinate.
-
-        :param pos_x: integer, x-axis coordinate.
-        :param pos_y: integer, y-axis coordinate.
-        :return: string, alias of the Workstation, None if not fond.
-        :return: Workstation, None if not found.
-        """
-        for name, ws in self.__workstations.items():
-            if ws.check_inside(pos_x, pos_y):
-                return name, ws
-        return None, None
-
-    def __move_pallet(self, pallet_id):
-        """
-        Move pallet according to its desired path.
-        :param pallet_id: string, ID of the pallet.
-        """
-        pallet = self.__pallets[pallet_id]
-
-        # Find the current position and clear the table cell
-        prev_x, prev_y = pallet.get_position()
-        self.__workspace[prev_x, prev_y] = (self.__workspace[prev_x, prev_y] // 10) * 10 + SceneSetup.EMPTY
-        pallet.move()
-
-        # Get new position and update the table
-        new_x, new_y = pallet.get_position()
-        self.__workspace[new_x, new_y] = (self.__workspace[new_x, new_y] // 10) * 10 + SceneSetup.OCCUPIED
-
-        if len(pallet.get_path()) == 0 and random.random() < 0.08:
-            self.move_to_ws(pallet_id, random.choice(list(SceneSetup.workstation_index.keys())))
-
     def __is_empty(self, x, y):
         """
-        Check if the designated slot is empty, simply by checking the last digit.
+        Check if the designated slot is empty in the occupation layer of the scene.
 
         :param x: integer, x-axis value.
         :param y: integer, y-axis value.
         :return: boolean, True if the condition is match, False otherwise.
         """
-        return self.__workspace[x, y] % 10 == SceneSetup.EMPTY
+        return self.__scene.is_empty(x, y)
 
     def __is(self, x, y, name):
         """
-        Check what kind of slot is the designated position, simply by checking the 2nd-to-last digit.
+        Check what kind of slot is the designated position in the layout of the scene.
 
         :param x: integer, x-axis value.
         :param y: integer, y-axis value.
         :param name: string, name of the block class.
         :return: boolean, True if the condition is match, False otherwise.
         """
-        return self.__workspace[x, y] // 10 * 10 == eval(f"SceneSetup.{name}")
+        return self.__scene.is_kind(x, y, getattr(SceneSetup, name))
 
     def __negotiate(self, conflicts, excluded=[]):
         """
@@ -182,9 +126,6 @@ class Controller:
         :param excluded: list, each element as ID of prioritized pallet.
         :return: string, ID of the winning pallet.
         """
-        s1 = f"Negotiating... {[c for c in conflicts]}"
-        logging.info(s1)
-
         if len(conflicts) > 1:
             # Some pallets have higher privilege
             if len(excluded) > 0:
@@ -196,14 +137,11 @@ class Controller:
                 winner = conflicts[[i for i, d in enumerate(delays) if d == max(delays)][0]]
 
                 ## Random selection
-                # winner = random.choice(conflicts)
-            s2 = f"Negotiating ended: {winner} won."
+                # winner = self.__random.choice(conflicts)
         else:
             winner = None
-            s2 = f"Negotiating ended: None."
 
-        logging.info(s2)
-        self.__log(f'{s1} {s2}')
+        self.__tracer.trace('negotiation', winner, len(conflicts))
 
         return winner
 
@@ -215,29 +153,47 @@ class Controller:
         """
         self.__pallets[pallet_id].set_path(path)
 
+    def __replace_path(self, pallet_id):
+        """
+        Apply only the difference of a pallet's path, just edited in the fleet, on the time windows.
+        :param pallet_id: string, ID of demanding pallet.
+        """
+        self.__profiler.count('replans')
+        row = self.__pallets[pallet_id].get_row()
+        prev_steps = self.__steps[row].copy()
+        steps = self.__g_dense[self.__fleet.get_steps(self.__H + 1, [row])[0]]
+        self.__steps[row], self.__lengths[row] = steps, self.__fleet.get_remaining()[row]
+
+        # Subtract the old path and add the new one
+        self.__window.add_path(prev_steps, self.__host[prev_steps], -1)
+        self.__window.add_path(steps, self.__host[steps])
+        self.__update_weights(np.union1d(self.__host[prev_steps], self.__host[steps]))
+
+    def __window_steps(self, path):
+        """
+        Get dense indices of the first H + 1 steps of a path, padded by staying at the end.
+        :param path: list, each element as ID of node in G.
+        :return: array, dense indices of nodes in G.
+        """
+        return np.array([self.__g_index[node] for node in path[:self.__H + 1]] +
+                        [self.__g_index[path[-1]]] * max(0, self.__H - len(path) + 1), dtype=int)
+
     def __update_traffic(self):
         """
-        Take the 2nd window in Extended Graph as the current.
+        Take the 1st window in the time windows as the current.
+        Shortest-path trees of the previous window are dropped as the weights change.
         """
-        self.__V = self.__ext_V[1]
-        self.__G = self.__ext_G[1]
+        self.__window.shift()
+        self.__trees = dict()
 
     def __calculate_timewindow(self):
         """
-        Create predict H-long windows as Extended Graph.
+        Predict H-long windows from the current state.
         Update the traffic cost in each window with according predefined paths.
         """
-        # Reduced copy costing time
-        self.__ext_G = [deepcopy(self.__G) for _ in range(2)] + [None for _ in range(self.__H - 1)]
-        self.__ext_V = [deepcopy(self.__V) for _ in range(2)] + [None for _ in range(self.__H - 1)]
-
-        # Gather all paths
-        paths = []
-        for pallet_id, pallet in self.__pallets.items():
-            path = pallet.get_path()
-            paths.append(path)
-
-        self.update_paths(paths)
+        # Keep the future steps of every pallet for collision detection
+        self.__lengths = self.__fleet.get_remaining()
+        self.__steps = self.__update_steps(self.__g_dense[self.__fleet.get_steps(self.__H + 1)])
 
     def __coordination(self):
         """
@@ -247,30 +203,30 @@ class Controller:
         t = 1
         # check windows 1, 2, ... H as 0 is current state
         while t < self.__H + 1:
-            node = self.__check_collision(t)
-            p1, p2 = self.__check_transition(t)
+            self.__profiler.count('passes')
+            collision = next((c for c in self.__detect_collisions() if c[0] == t), None)
+            swaps = self.__check_transition(t)
 
             # No conflict, move to next window
-            if node is None and p1 is None and p2 is None:
+            if collision is None and len(swaps) == 0:
                 t += 1
 
             # Lot-typed conflict(s) found, continuous resolve
-            elif p1 is None:
-                conflicts = self.__trace_collision(node, t)
-                logging.warning(f"Lot Conflicts: {[p for p in conflicts]}.")
-                [logging.warning(f"Pallet {p}: {self.__pallets[p].get_path()}") for p in conflicts]
-                excluded = [p for p in conflicts if self.__pallets[p].get_path()[t - 1] == node]
+            elif len(swaps) == 0:
+                _, node, conflicts = collision
+                self.__tracer.trace('lot', node, t, len(conflicts))
+                excluded = [p for p in conflicts if self.__fleet.get_node(self.__pallets[p].get_row(), t - 1) == node]
 
                 # Negotiation strategy
                 winner = self.__negotiate(conflicts, excluded)
+                self.__profiler.count('conflicts')
 
                 for pallet_id in conflicts:
                     if winner != pallet_id:
-                        pallet = self.__pallets[pallet_id]
-                        path = pallet.get_path()
+                        row = self.__pallets[pallet_id].get_row()
 
                         # Solution: wait for one iteration at t
-                        path = path[:t] + [path[t - 1]] + path[t - 1:]
+                        self.__fleet.insert_wait(row, t, 2)
 
                         # # Solution: find an alternative route, wait if cannot
                         # sub_path = self.generate_path(pallet_id, self.__pallets[pallet_id].get_goal(),
@@ -279,87 +235,96 @@ class Controller:
                         # path = path[:t - 1] + sub_path
 
                         # Update the path
-                        self.__set_path(pallet_id, path)
+                        self.__replace_path(pallet_id)
 
-                # Recalculate for recheck
-                self.__calculate_timewindow()
-
-            # Transition conflict(s) found
+            # Transition conflict(s) found, resolve every pair not sharing a pallet before recheck
             else:
-                logging.warning(f"Transition Conflicts: {p1, p2}.")
-                logging.warning(f"Pallet {p1}: {self.__pallets[p1].get_path()}")
-                logging.warning(f"Pallet {p2}: {self.__pallets[p2].get_path()}")
-
-                # Negotiation strategy
-                winner = self.__negotiate([p1, p2])
-
-                for pallet_id in [p1, p2]:
-                    if pallet_id != winner:
-                        pallet = self.__pallets[pallet_id]
-
-                        # Replace the part of path starting from the collision
-                        path = pallet.get_path()
-                        sub_path = self.generate_path(pallet_id, self.__pallets[pallet_id].get_goal(),
-                                                      source=path[t - 1],
-                                                      excluded=[self.__pallets[winner].get_path()[t - 1]])
-                        path = path[:t - 1] + sub_path
-
-                        self.__set_path(pallet_id, path)
-                self.__calculate_timewindow()
-
-    def __trace_collision(self, node, t):
-        """
-        Find pallets caused the lot-typed collision at a node at future t.
-
-        :param node: int, index of the node where the collision occurs.
-        :param t: the next t iterations when collision occurs.
-        :return: list, array of pallet_id.
-        """
-        conflicting_pallets = []
-
-        for pallet_id, pallet in self.__pallets.items():
-            path = pallet.get_path()
-
-            # Check if the pallet is moving at time t and at node
-            if len(path) > t and node == path[t]:
-                conflicting_pallets.append(pallet_id)
-
-        return conflicting_pallets
-
-    def __check_collision(self, t):
-        """
-        Check if any node G at future t is occupied more than 1.
-        :param t: integer, belongs to [1, H].
-        :return: string, ID of the crammed node, None if not found any.
-        """
-        # Moving into the same area
-        for node in self.__ext_G[t]:
-            if self.__ext_G[t].nodes[node]['occupied'] > 1:
-                logging.warning(f"Collision at NodeG {node} time T+{t}")
-                return node
-
-        return None
+                resolved = set()
+                for p1, p2 in swaps:
+                    if p1 in resolved or p2 in resolved:
+                        continue
+                    resolved.update((p1, p2))
+
+                    self.__tracer.trace('transition', p1, p2, t)
+
+                    # Negotiation strategy
+                    winner = self.__negotiate([p1, p2])
+                    self.__profiler.count('conflicts')
+
+                    for pallet_id in [p1, p2]:
+                        if pallet_id != winner:
+                            row = self.__pallets[pallet_id].get_row()
+
+                            # Replace the part of path starting from the collision
+                            source = self.__fleet.get_node(row, t - 1)
+                            excluded = self.__fleet.get_node(self.__pallets[winner].get_row(), t - 1)
+                            sub_path = self.generate_path(pallet_id, self.__pallets[pallet_id].get_goal(),
+                                                          source=source, excluded=[excluded])
+                            self.__fleet.splice(row, t - 1, sub_path)
+
+                            self.__replace_path(pallet_id)
+
+    def __detect_collisions(self):
+        """
+        Find every node in G occupied more than 1 in windows 1, 2, ... H,
+        together with the pallets moving into it.
+
+        :return: list, each element as window t, ID of the crammed node and list of IDs of the moving pallets,
+            ordered by t and then by node.
+        """
+        window = self.__window
+        crowded = window.occupied_g[1:] > 1
+        if not crowded.any():
+            return []
+
+        # Future nodes of every pallet as a (H, P) matrix, keyed by window and node
+        num_g = crowded.shape[1]
+        windows = np.arange(self.__H)[:, None]
+        steps = self.__steps[:, 1:].T
+        keys = windows * num_g + steps
+
+        # Pallets still moving at t and heading to a crowded node, grouped by key in pallet order,
+        # those which already reached the end of their path only count as occupation
+        involved = crowded[windows, steps] & (windows + 1 < self.__lengths)
+        rows, members = np.nonzero(involved)
+        order = np.argsort(keys[rows, members], kind='stable')
+        members, member_keys = members[order], keys[rows, members][order]
+
+        # Slice the group of each crowded node
+        crowded_keys = np.flatnonzero(crowded)
+        starts = np.searchsorted(member_keys, crowded_keys, side='left')
+        ends = np.searchsorted(member_keys, crowded_keys, side='right')
+
+        pallet_ids = self.__fleet.get_ids()
+        return [(int(key // num_g) + 1, self.__g_nodes[key % num_g], [pallet_ids[p] for p in members[start:end]])
+                for key, start, end in zip(crowded_keys, starts, ends)]
 
     def __check_transition(self, t):
         """
         Check if any there is exchange collision at future t.
         :param t: integer, belongs to [1, H].
-        :return: string x2, IDs of two neighboring nodes, None x2 if not found any.
+        :return: list, each element as IDs of two swapping pallets, empty if not found any.
         """
-        paths = {}
-        for pallet_id, pallet in self.__pallets.items():
-            path = pallet.get_path()
-            prev_position = path[t - 1] if t < len(path) + 1 else path[-2] if len(path) > 1 else path[0]
+        # Edge of each pallet at t, a pallet past the end of its path taking its last edge
+        remaining = self.__fleet.get_remaining()
+        prev_offsets = np.where(t - 1 < remaining, t - 1, np.maximum(remaining - 2, 0))
+        next_offsets = np.minimum(t, remaining - 1)
+        moves = list(zip(self.__fleet.get_nodes(prev_offsets).tolist(), self.__fleet.get_nodes(next_offsets).tolist()))
 
-            next_position = path[t] if t < len(path) else path[-1]
-            paths[pallet_id] = [prev_position, next_position]
+        # Index pallets by the edge they are moving along
+        edges = {}
+        for i, move in enumerate(moves):
+            edges.setdefault(move, []).append(i)
 
-        for p1, t1 in paths.items():
-            for p2, t2 in paths.items():
-                if p1 != p2 and t1[0] == t2[1] and t1[1] == t2[0]:
-                    return p1, p2
+        # Look up the reversed edge of each pallet, pairing only with later pallets to report once
+        swaps = []
+        pallet_ids = self.__fleet.get_ids()
+        for i, (prev_position, next_position) in enumerate(moves):
+            for j in edges.get((next_position, prev_position), []):
+                if j > i:
+                    swaps.append((pallet_ids[i], pallet_ids[j]))
 
-        return None, None
+        return swaps
 
     # TODO: add transition checking
     def __sim_verify(self):
@@ -367,10 +332,54 @@ class Controller:
         Verification after each simulation iteration.
         :return: node, ID of node which is crammed, None if not found any.
         """
-        for node in self.__G:
-            if self.__G.nodes[node]['occupied'] > 1:
-                logging.critical(f"Collision at NodeG {node}")
-                return node
+        crammed = np.flatnonzero(self.__window.occupied_g[0] > 1)
+        if len(crammed) > 0:
+            node = self.__g_nodes[crammed[0]]
+            self.__tracer.trace('collision', node)
+            return node
+
+    def reset(self, pallets=(), seed=None):
+        """
+        Restore the initial state in place for a new episode.
+        Graphs, consensus operator, layout and allocated arrays are kept, only their content is cleared.
+
+        :param pallets: list, each element as initial x and y of a pallet, None for the default feeding position.
+        :param seed: integer, seed of a new random stream of the same kind as the current one,
+            None to keep drawing from the current one.
+        :return: list, ID of each added pallet.
+        """
+        if seed is not None:
+            self.__reseed(seed)
+        self.__scene.clear()
+        self.__window.clear()
+        self.__history.clear()
+        self.__fleet.clear()
+        self.__trees = dict()
+        self.__unexpected_event = False
+        self.__idle_step = 0
+        if isinstance(self.__profiler, StepProfiler):
+            self.__profiler = StepProfiler()
+
+        self.__pallets = dict()
+        self.__next_id = 1
+        self.__workstations = dict()
+        self.__add_workstations()
+        self.__tracer.clear()
+
+        return self.add_pallets(pallets)
+
+    def __reseed(self, seed):
+        """
+        Replace the random stream by a new one of the same kind, e.g. the same bit generator of an injected
+        numpy Generator, so that runs drawing common random numbers stay comparable.
+        :param seed: integer, seed of the new stream.
+        """
+        if isinstance(self.__random, np.random.Generator):
+            self.__random = np.random.Generator(type(self.__random.bit_generator)(seed))
+        elif isinstance(self.__random, random.Random):
+            self.__random = type(self.__random)(seed)
+        else:
+            raise ValueError(f"Cannot reseed the injected random source {self.__random!r}, reset without a seed.")
 
     def add_pallet(self, pos_x=SceneSetup.DEFAULT_FEED_X, pos_y=SceneSetup.DEFAULT_FEED_Y):
         """
@@ -382,49 +391,82 @@ class Controller:
         :param pos_y: integer, initial y-axis value
         :return pallet_id: string, ID of the pallet
         """
-        # Check indexing and create a new one
-        if len(self.__pallets.keys()) == 0:
-            pallet_id = "001"
-        else:
-            pallet_id = str(max([int(idx) for idx in self.__pallets.keys()]) + 1).zfill(3)
-
-        new_pallet = None
-
-        # Create a new pallet instance
-        for node_id in self.__G.nodes:
-            if (node := self.__G.nodes[node_id])['position'] == [pos_x, pos_y]:
-                new_pallet = Pallet(pallet_id, node['node'])
-                node['occupied'] += 1
-                (host := self.__V.nodes[node['host']])['occupied'] += 1
-                if self.__origin:
-                    host['weight'] = self.__K * (host['occupied'] / (host['capacity'] - host['occupied'])
-                                                 if host['occupied'] < host['capacity'] else host['capacity'])
-                else:
-                    host['weight'] = self.__K * host['occupied'] / host['capacity']
-                break
-
-        # Check if the pallet was put inside any workstation
-        name, ws = self.__find_workstation(pos_x, pos_y)
-        if name is not None:
+        return self.add_pallets([(pos_x, pos_y)])[0]
+
+    def add_pallets(self, positions):
+        """
+        Add a whole fleet at once, each pallet as by add_pallet.
+        Every position is checked before any pallet is added.
+
+        :param positions: list, each element as initial x and y of a pallet, None for the default feeding position.
+        :return: list, ID of each pallet.
+        """
+        default = (SceneSetup.DEFAULT_FEED_X, SceneSetup.DEFAULT_FEED_Y)
+        positions = np.array([default if p is None else p for p in positions], dtype=np.int64).reshape(-1, 2)
+        g = self.__G.locate(positions[:, 0], positions[:, 1])
+        if (g == -1).any():
+            raise ValueError(f"No node in G at position {positions[np.argmax(g == -1)].tolist()}.")
+
+        # IDs only ever count up
+        pallet_ids = [str(i).zfill(3) for i in range(self.__next_id, self.__next_id + len(g))]
+        self.__next_id += len(g)
+
+        # Create the pallet instances
+        nodes = self.__G.nodes[g]
+        pallets = self.__fleet.add_all(pallet_ids, nodes)
+        self.__history.add_pallets(nodes)
+        self.__pallets.update(zip(pallet_ids, pallets))
+
+        # Occupation and weight of the current window
+        hosts = self.__host[g]
+        np.add.at(self.__window.occupied_g[0], g, 1)
+        np.add.at(self.__window.occupied_v[0], hosts, 1)
+        self.__update_current_weights(np.unique(hosts))
+
+        # Check if the pallets were put inside any workstation
+        for i in np.flatnonzero(self.__ws_grid[positions[:, 0], positions[:, 1]] != -1).tolist():
+            name = self.__ws_names[self.__ws_grid[positions[i, 0], positions[i, 1]]]
             # Update the current workstation alias
-            new_pallet.set_ws(name)
+            pallets[i].set_ws(name)
             # Update the state of the workstation
             # TODO: additional property telling which pallet is inside the Workstation
-            ws.set_state(Workstation.BUSY)
+            self.__workstations[name].set_state(Workstation.BUSY)
 
-        # Update the pallet list and the prediction window
-        self.__pallets[pallet_id] = new_pallet
+        return pallet_ids
 
-        return pallet_id
+    def __update_current_weights(self, v):
+        """
+        Calculate the weight of nodes in V in the current window after pallets were added or removed.
+        :param v: array, dense indices of nodes in V whose occupation changed.
+        """
+        occupied, capacity = self.__window.occupied_v[0, v].astype(float), self.__V.capacity[v]
+        if self.__origin:
+            self.__window.weight_v[0, v] = self.__K * np.divide(occupied, capacity - occupied,
+                                                                where=occupied < capacity, out=capacity.copy())
+        else:
+            self.__window.weight_v[0, v] = self.__K * occupied / capacity
 
     def remove_pallet(self, pallet_id):
         """
         Take the pallet out of line.
-        Remove the pallet instance from the list and the prediction window.
+        The last pallet of the fleet takes its row and its column in the history.
         :param pallet_id: string, the ID of the pallet
         """
-        del self.__pallets[pallet_id]
-        del self.__predict_window[pallet_id]
+        row = self.__pallets.pop(pallet_id).get_row()
+
+        # Free its node and sector in the current window
+        g = self.__g_index[int(self.__fleet.position[row])]
+        self.__window.occupied_g[0, g] -= 1
+        self.__window.occupied_v[0, self.__host[g]] -= 1
+        self.__update_current_weights(self.__host[[g]])
+
+        moved = self.__fleet.remove(row)
+        self.__history.remove_pallet(row)
+        if moved is not None:
+            self.__pallets[moved].set_row(row)
+
+        # Keep the pallets in the order of the rows, as the per-pallet loops rely on it
+        self.__pallets = {pallet_id: self.__pallets[pallet_id] for pallet_id in self.__fleet.get_ids()}
 
     def move_to_ws(self, pallet_id, ws_name):
         """
@@ -435,105 +477,72 @@ class Controller:
         """
         pallet = self.__pallets[pallet_id]
         # queue = self.__workstations[ws_name].get_queue_path()
-        logging.info(f"Received new order for pallet {pallet_id} going to workstation {ws_name}.")
+        self.__tracer.trace('order', pallet_id, ws_name)
 
-        dest = self.__workstations[ws_name].get_entry().tolist()
-        for node in self.__G.nodes:
-            if self.__G.nodes[node]['position'] == dest:
-                # self.generate_path(pallet_id, node)
-                pallet.set_goal(node)
-                pallet.set_target(ws_name)
-                return
+        if ws_name in self.__ws_entry:
+            # self.generate_path(pallet_id, node)
+            pallet.set_goal(self.__ws_entry[ws_name])
+            pallet.set_target(ws_name)
 
     def update_paths(self, paths):
         """
-        Update occupied property of nodes in Extended Graph according to input paths.
-        After that calculate the weight on each edge in V.
+        Update occupied property of nodes in the time windows according to input paths.
+        After that calculate the weight on each node in V and each inter-sector edge in G.
         :param paths: list, each element as a list of IDs of node in G
+        :return: array, dense indices of the first H + 1 nodes in G of each path.
         """
-        # TODO: concern about shallow copy
-        paths = [path + [path[-1] for _ in range(max(0, self.__H - len(path) + 1))] for path in paths]
+        steps = np.array([self.__window_steps(path) for path in paths], dtype=int).reshape(len(paths), self.__H + 1)
+        return self.__update_steps(steps)
+
+    def __update_steps(self, steps):
+        """
+        Update the time windows according to the first steps of every pallet.
+        :param steps: array, (P, H + 1) dense indices of the first H + 1 nodes in G of each path.
+        :return: array, steps.
+        """
+        window = self.__window
+        num_g, num_v = window.occupied_g.shape[1], window.occupied_v.shape[1]
+        hosts = self.__host[steps]
 
         # Update windows 1, 2, ... H as 0 is current state
         for i in range(1, self.__H + 1):
-            for p in paths:
-                # Change occupation
-                # logging.debug(f"Window {i} {p[i - 1]} {p[i]}")
-                new_node_g = self.__ext_G[i].nodes[(new_id_g := p[i])]
-                prev_node_g = self.__ext_G[i].nodes[(prev_id_g := p[i - 1])]
-                if prev_id_g != new_id_g:
-                    new_node_g['occupied'] += 1
-                    prev_node_g['occupied'] -= 1
-
-                    # Find host
-                    new_node_v = self.__ext_V[i].nodes[(new_id_v := new_node_g['host'])]
-                    prev_node_v = self.__ext_V[i].nodes[(prev_id_v := prev_node_g['host'])]
-
-                    # If crossing sectors
-                    if new_id_v != prev_id_v:
-                        # Change occupation
-                        new_node_v['occupied'] += 1
-                        prev_node_v['occupied'] -= 1
-
-                        # # Update weight
-                        # new_node_v['weight'] = self.__K * (
-                        #     new_node_v['occupied'] / (new_node_v['capacity'] - new_node_v['occupied'])
-                        #     if new_node_v['occupied'] < new_node_v['capacity'] else new_node_v['capacity'])
-                        #
-                        # prev_node_v['weight'] = self.__K * (
-                        #     prev_node_v['occupied'] / (prev_node_v['capacity'] - prev_node_v['occupied'])
-                        #     if prev_node_v['occupied'] < prev_node_v['capacity'] else prev_node_v['capacity'])
-                        #
-                        # # Update weight
-                        # if (prev_id_v, new_id_v) in self.__ext_V[i].edges:
-                        #     prev_edge_v = self.__ext_V[i].edges[prev_id_v, new_id_v]
-                        #     prev_edge_v['weight'] = prev_edge_v['distance'] + new_node_v['weight']
-                        # if (new_id_v, prev_id_v) in self.__ext_V[i].edges:
-                        #     new_edge_v = self.__ext_V[i].edges[new_id_v, prev_id_v]
-                        #     new_edge_v['weight'] = new_edge_v['distance'] + prev_node_v['weight']
-
-            # Update weight on each node
-            # Formulation
-            arr = []
-            for node in self.__ext_V[i].nodes:
-                node_v = self.__ext_V[i].nodes[node]
-                if self.__origin:
-                    node_v['weight'] = self.__K * (node_v['occupied'] / (node_v['capacity'] - node_v['occupied'])
-                                                   if node_v['occupied'] < node_v['capacity'] else node_v['capacity'])
-                else:
-                    node_v['weight'] = self.__K * node_v['occupied'] / node_v['capacity']
-                    arr.append([node_v['weight']])
-
-            if not self.__origin:
-                # Consensus
-                weights = np.array(arr)
-                new_weights = (1 + self.__K * self.__V_laplacian) @ weights
-                for node in self.__ext_V[i].nodes:
-                    node_v = self.__ext_V[i].nodes[node]
-                    # node_v['weight'] = max(new_weights[node - 1, 0], 0)
-                    node_v['weight'] = new_weights[node - 1, 0]
-
-            # Update weight on each edge V
-            for node in self.__ext_V[i].nodes:
-                node_v = self.__ext_V[i].nodes[node]
-                for edge in self.__ext_V[i].in_edges(node_v):
-                    # edge['weight'] = edge['distance'] + node_v['weight']
-                    edge['weight'] = max(edge['distance'] + node_v['weight'], 0)
-
-            # Reset and Update weight on each edge G
-            for e in self.__G_weighted_edges:
-                self.__ext_G[i].edges[e]['weight'] = 1.
-
-            for e in self.__G_weighted_edges:
-                edge = self.__ext_G[i].edges[e]
-                new_v = self.__ext_V[i].nodes[e[1] // 100]
-                edge['weight'] = max(new_v['weight'] + edge['weight'], 0)
-
-
-            # Copy ith window to (i+1)th for continuous update
-            if i != self.__H:
-                self.__ext_G[i + 1] = deepcopy(self.__ext_G[i])
-                self.__ext_V[i + 1] = deepcopy(self.__ext_V[i])
+            # Change occupation by the pallets leaving and entering each node
+            window.occupied_g[i] = window.occupied_g[i - 1] + np.bincount(steps[:, i], minlength=num_g) \
+                - np.bincount(steps[:, i - 1], minlength=num_g)
+            window.occupied_v[i] = window.occupied_v[i - 1] + np.bincount(hosts[:, i], minlength=num_v) \
+                - np.bincount(hosts[:, i - 1], minlength=num_v)
+
+        self.__update_weights()
+        return steps
+
+    def __update_weights(self, touched=None):
+        """
+        Calculate the weight on nodes in V and inter-sector edges in G of windows 1, 2, ... H.
+        :param touched: array, dense indices of nodes in V whose occupation changed, None for all.
+        """
+        window = self.__window
+
+        # Consensus couples every node in V, so only the origin formulation is local
+        if touched is None or not self.__origin:
+            touched = slice(None)
+            edges = slice(None)
+        else:
+            edges = np.flatnonzero(np.isin(self.__G_weighted_hosts, touched))
+
+        # Update weight on each node of all windows at once
+        # Formulation
+        occupied, capacity = window.occupied_v[1:, touched].astype(float), self.__V.capacity[touched]
+        if self.__origin:
+            weights = np.divide(occupied, capacity - occupied, where=occupied < capacity,
+                                out=np.repeat(capacity[None, :], len(occupied), axis=0))
+            window.weight_v[1:, touched] = self.__K * weights
+        else:
+            # Consensus
+            window.weight_v[1:] = self.__consensus.apply(self.__K * occupied / capacity)
+
+        # Update weight on each inter-sector edge G, edges in V keep their distance
+        window.weight_g[1:, self.__G_weighted_edges[edges]] = np.maximum(
+            window.weight_v[1:, self.__G_weighted_hosts[edges]] + 1., 0)
 
     def generate_path(self, pallet_id, target, source=None, excluded=[]):
         """
@@ -549,33 +558,87 @@ class Controller:
         if source is None:
             source = pallet.get_position()
 
-        excluded_v = [self.__G.nodes[g]['host'] for g in excluded]
-        available_v = [v for v in self.__V.nodes if v not in excluded_v or v in [target // 100, source // 100]]
-
-        try:
-            seq_v = nx.dijkstra_path(nx.subgraph(self.__V, available_v), source // 100, target // 100, weight='weight')
-            # seq_v = nx.bellman_ford_path(nx.subgraph(self.__V, available_v), source // 100, target // 100, weight='weight')
-        except nx.NetworkXNoPath as e:
-            logging.warning(f"Pallet {pallet_id} has to go through {excluded_v} due to no sufficient path to {target}.")
-            seq_v = nx.dijkstra_path(self.__V, source // 100, target // 100, weight='weight')
-            # seq_v = nx.bellman_ford_path(self.__V, source // 100, target // 100, weight='weight')
-
-        sub_v = [sub for v in seq_v for sub in self.__V.nodes[v]['sub']]
-        available_g = [v for v in sub_v if v not in excluded]
-        # available_g = [sub for v in seq_v for sub in self.__V.nodes[v]['sub']]
-        # TODO: check if weight in W is updated
+        # Walk along the cached shortest-path tree of the target, within the corridor of each sector
+        source_g, target_g = self.__g_index[source], self.__g_index[target]
+        if len(excluded) == 0:
+            next_g = self.__route_tree(target).reach(source_g)
+            if next_g[source_g] == -1:
+                self.__tracer.trace('stuck', pallet_id, source, target)
+                return [source, source]
+
+            path = [source_g]
+            while path[-1] != target_g:
+                path.append(next_g[path[-1]])
+            path = [self.__g_nodes[g] for g in path]
+            self.__tracer.trace('route', pallet_id, source, target, len(path))
+            return path
+
+        # Sectors of the excluded nodes are blocked, except the ones of source and target
+        source_v, target_v = self.__g_host[source_g], self.__g_host[target_g]
+        v_weights = self.__V.weight.tolist()
+        excluded_v = {self.__g_host[self.__g_index[g]] for g in excluded} - {source_v, target_v}
+        seq_v = hierarchy_graph.dijkstra(self.__V, source_v, target_v, v_weights, blocked=excluded_v)
+        self.__profiler.count('searches')
+        if seq_v is None:
+            self.__tracer.trace('blocked', pallet_id, source, target)
+            seq_v = hierarchy_graph.dijkstra(self.__V, source_v, target_v, v_weights)
+            self.__profiler.count('searches')
+
+        # Only the nodes hosted by the sequence of sectors are allowed
         # Also include the current position
-        try:
-            path = nx.dijkstra_path(nx.subgraph(self.__G, available_g), source, target, weight='weight')
-            # path = nx.bellman_ford_path(nx.subgraph(self.__G, available_g), source, target, weight='weight')
-        except nx.NetworkXNoPath as e:
-            logging.warning(f"Pallet {pallet_id} staying in {source} due to no sufficient path to {target}.")
+        path = None
+        if seq_v is not None:
+            allowed_v = np.zeros(len(self.__V), dtype=bool)
+            allowed_v[seq_v] = True
+            path = hierarchy_graph.dijkstra(self.__G, source_g, target_g, self.__window.weight_g[0].tolist(),
+                                            blocked={self.__g_index[g] for g in excluded},
+                                            allowed=allowed_v[self.__host].tolist())
+            self.__profiler.count('searches')
+        if path is None:
+            self.__tracer.trace('stuck', pallet_id, source, target)
             path = [source, source]
+        else:
+            path = [self.__g_nodes[g] for g in path]
 
-        logging.info(
-            f"Generated path for pallet {pallet_id} going from node {source}: {path} excluding node {excluded}.")
+        self.__tracer.trace('reroute', pallet_id, source, target, excluded[0])
         return path
 
+    def __route_tree(self, target):
+        """
+        Get the reverse shortest-path tree toward a target node in G for the current window, shared by every source.
+        A node only leads into the sectors on the shortest route in V from its own sector, so a route stays in the
+        corridor of the sector it starts from, as a search over the nodes hosted by that corridor did.
+        Equal-cost routes are broken from the target instead of from the source, and may resolve differently.
+
+        :param target: integer, ID of end node in G.
+        :return: ReverseTree, grown on demand up to each source.
+        """
+        if target not in self.__trees:
+            target_g = self.__g_index[target]
+            self.__profiler.count('trees')
+            self.__trees[target] = hierarchy_graph.ReverseTree(self.__G, target_g, self.__window.weight_g[0].tolist(),
+                                                               self.__corridor_edges(self.__g_host[target_g]))
+        return self.__trees[target]
+
+    def __corridor_edges(self, target_v):
+        """
+        Get the edges in G leading into a sector on the shortest route in V from the sector they leave.
+        Corridors never change as the weights of V are static.
+
+        :param target_v: integer, dense index of the target node in V.
+        :return: list, whether each edge in G may be used toward the target sector.
+        """
+        if target_v not in self.__corridors:
+            corridor = np.zeros((len(self.__V), len(self.__V)), dtype=bool)
+            v_weights = self.__V.weight.tolist()
+            for source_v in range(len(self.__V)):
+                seq_v = hierarchy_graph.dijkstra(self.__V, source_v, target_v, v_weights)
+                self.__profiler.count('searches')
+                if seq_v is not None:
+                    corridor[source_v, seq_v] = True
+            self.__corridors[target_v] = corridor[self.__host[self.__G.source], self.__host[self.__G.indices]].tolist()
+        return self.__corridors[target_v]
+
     def update(self):
         """
         Make the system moving forward one step
@@ -586,41 +649,52 @@ class Controller:
         5. Execute the next step of every pallet
         6. Verify conflicts
         """
-        logging.info("###### Started new update round ######")
-
-        for node in self.__V.nodes:
-            logging.info(f"NodeV {node}: {self.__V.nodes[node]['occupied']} occupied, {self.__V.nodes[node]['weight']}")
-        self.__hist_V.append(self.__V)
+        self.__profiler.start()
+        self.__tracer.step()
+        if self.__tracer.is_enabled('sector'):
+            for i, node in enumerate(self.__v_nodes):
+                self.__tracer.trace('sector', node, int(self.__window.occupied_v[0, i]),
+                                    value=float(self.__window.weight_v[0, i]))
+        self.__history.record(self.__fleet.get_positions(), self.__window.occupied_v[0])
+        self.__profiler.lap('history')
 
         self.__unexpected_event = False
 
         # Generate path (optional)
         # Automatic move to new WS
-        for pallet_id, pallet in self.__pallets.items():
-            if pallet.get_goal() == pallet.get_position() or pallet.get_goal() is None:
+        goals = self.__fleet.get_goals()
+        arrived = ((goals == self.__fleet.get_positions()) | (goals == Fleet.NONE)).tolist()
+        for (pallet_id, pallet), idle in zip(self.__pallets.items(), arrived):
+            if idle:
                 self.__unexpected_event = True
                 available_ws = list(SceneSetup.workstation_index.keys())
                 available_ws.remove(pallet.get_ws()) if pallet.get_ws() is not None else None
-                self.move_to_ws(pallet_id, random.choice(available_ws))
+                self.move_to_ws(pallet_id, self.__random.choice(available_ws))
 
             if self.__unexpected_event or self.__idle_step % (self.__H) == 0:
                 path = self.generate_path(pallet_id, pallet.get_goal())  # Also include the current position
                 self.__set_path(pallet_id, path)
 
+        self.__profiler.lap('planning')
+
         # Update the timewindow
         self.__calculate_timewindow()
+        self.__profiler.lap('timewindow')
 
         # Coordination
         if self.__unexpected_event or self.__idle_step % self.__H == 0:
             self.__coordination()
             self.__idle_step = 0
+        self.__profiler.lap('coordination')
 
         # Execute movement
-        for pallet in self.__pallets.values():
-            pallet.move()
+        self.__fleet.move_all()
         self.__update_traffic()
+        self.__history.step(self.__fleet.get_positions(), self.__window.occupied_v[0])
+        self.__profiler.lap('movement')
         self.__sim_verify()
         self.__idle_step += 1
+        self.__profiler.lap('verification')
 
     def get_path(self, pallet_id):
         """
@@ -636,14 +710,14 @@ class Controller:
         Return size width, height
         :return: integer x2, as the width and height of the workspace
         """
-        return self.__workspace.shape[0], self.__workspace.shape[1]
+        return self.__scene.get_shape()
 
     def get_workspace(self):
         """
         Get current state of the workspace
         :return: list of
         """
-        return self.__workspace.tolist()
+        return self.__scene.get_grid().tolist()
 
     def get_pallet(self, pallet_id):
         """
@@ -651,8 +725,8 @@ class Controller:
         :param pallet_id: string, ID of demanding pallet
         :return: dict, with integer value of x and y as values
         """
-        node = self.__pallets[pallet_id].get_position()
-        return dict({'x': self.__G.nodes[node]['position'][0], 'y': self.__G.nodes[node]['position'][1]})
+        x, y = self.__G.position[self.__g_index[self.__pallets[pallet_id].get_position()]].tolist()
+        return dict({'x': x, 'y': y})
 
     def get_all_pallets(self):
         """
@@ -661,63 +735,87 @@ class Controller:
         """
         return {pallet_id: self.get_pallet(pallet_id) for pallet_id in self.__pallets}
 
-    def get_log(self):
-        return self.__logger[:]
+    def get_tracer(self):
+        """
+        :return: Tracer, trace of the Controller, to enable categories or dump the records.
+        """
+        return self.__tracer
+
+    def get_profile(self):
+        """
+        Get the duration of each phase and the counters of each step, see StepProfiler.get_profile.
+        :return: dict, None if the Controller was created without profile.
+        """
+        return self.__profiler.get_profile()
 
     def get_occupied(self):
-        return self.__V.nodes.data('occupied')
+        return list(zip(self.__v_nodes, self.__window.occupied_v[0].tolist()))
+
+    def record_occupied(self, out):
+        """
+        Write the current occupation of each node in V into a preallocated row, in the order of get_occupied.
+        :param out: array, (|V|,) destination.
+        """
+        out[:] = self.__window.occupied_v[0]
 
     def get_capacity(self):
-        return self.__V.nodes.data('capacity')
+        return list(zip(self.__v_nodes, self.__V.capacity.tolist()))
 
     def get_history(self):
         """
         Get historical tracks of all pallets
-        :return: list, each element as a list of G-nodes
+        :return: list, each element as a view of IDs of node in G since the pallet was added
         """
-        return [pallet.get_history() for pallet in self.__pallets.values()]
+        return self.__history.get_tracks()
+
+    def get_trajectory(self):
+        """
+        Get the historical trajectory of all pallets, one row per step.
+        :return: array, (T, P) view of ID of node in G of each pallet, -1 before the pallet was added.
+        """
+        return self.__history.get_trajectory()
+
+    def get_occupied_history(self):
+        """
+        Get the historical occupation of the topology, one row per step.
+        :return: array, (T, |V|) view of the occupation of each node in V, in the order of get_occupied.
+        """
+        return self.__history.get_occupied()
 
     def get_G(self):
-        return self.__G
+        """
+        Get a networkx view of the roadmap with the current occupation and weights.
+        :return: DiGraph, G.
+        """
+        G = self.__G.to_networkx(self.__window.weight_g[0])
+        for node, position, host, occupied in zip(self.__g_nodes, self.__G.position.tolist(), self.__g_host,
+                                                  self.__window.occupied_g[0].tolist()):
+            G.nodes[node].update(node=node, position=position, host=self.__v_nodes[host], occupied=occupied)
+        return G
 
     def get_V(self):
-        return self.__V
+        """
+        Get a networkx view of the topology with the current occupation and weights.
+        :return: DiGraph, V.
+        """
+        V = self.__V.to_networkx()
+        for node, capacity, occupied, weight in zip(self.__v_nodes, self.__V.capacity.tolist(),
+                                                    self.__window.occupied_v[0].tolist(),
+                                                    self.__window.weight_v[0].tolist()):
+            V.nodes[node].update(sub=[], capacity=capacity, occupied=occupied, weight=weight)
+        for node, host in zip(self.__g_nodes, self.__g_host):
+            V.nodes[self.__v_nodes[host]]['sub'].append(node)
+        return V
 
     def history_plot(self):
         """
         Plot the Extended Graph based on historical tracks of all pallets
         """
-        ax = plt.figure().add_subplot(projection='3d')
-        ax.invert_yaxis()
-
-        # Plot a base map using the x and y axes.
-        x = [self.__G.nodes[node]['position'][0] for node in self.__G.nodes]
-        y = [self.__G.nodes[node]['position'][1] for node in self.__G.nodes]
-        ax.scatter(x, y, zs=0, zdir='z', label='roadmap', marker='.')
-
-        # Plot the tracks
-        for i, pallet in enumerate(self.__pallets.values()):
-            hist = pallet.get_history()
-            x = [self.__G.nodes[node]['position'][0] for node in hist]
-            y = [self.__G.nodes[node]['position'][1] for node in hist]
-            z = [i for i in range(len(hist))]
-            ax.plot(x, y, z)
-
-        # Make legend, set axes limits and labels
-        ax.legend()
-        ax.set_xlim(0, 57)
-        ax.set_ylim(0, 7)
-        ax.set_zlim(0, len(self.__hist_V))
-        ax.set_xlabel('X')
-        ax.set_ylabel('Y')
-        ax.set_zlabel('Iteration')
-        ax.set_box_aspect((58, 24, 30))
-
-        # Customize the view angle so it's easier to see that the scatter points lie
-        # on the plane y=0
-        ax.view_init(elev=10., azim=-30, roll=0)
-
-        plt.show()
+        import plots
+
+        plots.history_plot(self.__G.position,
+                           [self.__G.position[self.__g_dense[hist]] for hist in self.__history.get_tracks()],
+                           len(self.__history.get_occupied()))
 
 
 if __name__ == '__main__':
@@ -0,0 +1,424 @@
+import hashlib
+import heapq
+import json
+import os
+import numpy as np
+
+CACHE = '.compiled'  # Folder of compiled graphs, inside the folder of the configuration files
+COMPILED_FORMAT = 3  # Version of the compiled graphs, to be increased whenever their arrays change
+
+
+class CSRGraph:
+    """
+    Directed graph compiled into compressed sparse rows over dense node indices.
+    Outgoing edges of each node keep the order they were added in, the same as in networkx,
+    so searches break ties the same way.
+    """
+    ARRAYS = ('nodes', 'source', 'indices', 'distance', 'indptr', 'rindices', 'redges', 'rindptr')
+
+    def __init__(self, nodes, edges):
+        """
+
+        :param nodes: list, each element as ID of node.
+        :param edges: list, each element as ID of source, ID of target and distance.
+        """
+        self.nodes = np.array(nodes, dtype=np.int64)
+        index = {node: i for i, node in enumerate(nodes)}
+        num_nodes = len(nodes)
+
+        # A repeated edge keeps its first position and its last distance
+        unique = dict()
+        for u, v, d in edges:
+            unique[index[u], index[v]] = d
+        added_source = np.array([e[0] for e in unique], dtype=np.int64)
+        added_target = np.array([e[1] for e in unique], dtype=np.int64)
+        added_distance = np.array(list(unique.values()), dtype=float)
+
+        # Outgoing rows, each edge ID is its position in the rows
+        order = np.argsort(added_source, kind='stable')
+        edge_id = np.empty(len(order), dtype=np.int64)
+        edge_id[order] = np.arange(len(order))
+        self.source = added_source[order]
+        self.indices = added_target[order]
+        self.distance = added_distance[order]
+        self.indptr = np.concatenate(([0], np.cumsum(np.bincount(self.source, minlength=num_nodes))))
+
+        # Incoming rows, ordered as the edges were added into each node
+        reverse = np.argsort(added_target, kind='stable')
+        self.rindices = added_source[reverse]
+        self.redges = edge_id[reverse]
+        self.rindptr = np.concatenate(([0], np.cumsum(np.bincount(added_target, minlength=num_nodes))))
+        self._prepare()
+
+    @classmethod
+    def from_arrays(cls, arrays):
+        """
+        Restore a compiled graph without compiling it again.
+        :param arrays: dict, each name in ARRAYS as its array, possibly memory-mapped and read-only.
+        :return: CSRGraph, of the class called on.
+        """
+        graph = cls.__new__(cls)
+        for name in cls.ARRAYS:
+            setattr(graph, name, arrays[name])
+        graph._prepare()
+        return graph
+
+    def to_arrays(self):
+        """
+        :return: dict, each name in ARRAYS as its array.
+        """
+        return {name: getattr(self, name) for name in self.ARRAYS}
+
+    def _prepare(self):
+        """
+        Derive the lookups which are not worth storing from the compiled arrays.
+        """
+        nodes = self.nodes.tolist()
+        self.index = {node: i for i, node in enumerate(nodes)}
+        self.weight = np.array(self.distance, dtype=float)
+
+        # Plain lists for the searches, indexing numpy scalars one by one is slow
+        self._indptr, self._indices = self.indptr.tolist(), self.indices.tolist()
+        self._rindptr, self._rindices, self._redges = self.rindptr.tolist(), self.rindices.tolist(), self.redges.tolist()
+
+    def __len__(self):
+        return len(self.nodes)
+
+    def shortest_distances(self, weight=None):
+        """
+        Calculate the all-pairs shortest distances with Floyd-Warshall.
+        :param weight: array, weight of each edge, the base weight if None.
+        :return: array, (N, N) distance from row node to column node, inf if unreachable.
+        """
+        weight = self.weight if weight is None else weight
+        dist = np.full((len(self), len(self)), np.inf)
+        dist[self.source, self.indices] = weight
+        np.fill_diagonal(dist, 0.)
+        for k in range(len(self)):
+            dist = np.minimum(dist, dist[k, :][np.newaxis, :] + dist[:, k][:, np.newaxis])
+        return dist
+
+    def to_networkx(self, weight=None):
+        """
+        Build a networkx graph of the current state, for visualization only.
+        :param weight: array, weight of each edge, the base weight if None.
+        :return: DiGraph, with 'distance', 'weight' and 'index' of each edge.
+        """
+        import networkx as nx
+
+        weight = self.weight if weight is None else weight
+        graph = nx.DiGraph()
+        graph.add_nodes_from(self.nodes.tolist())
+        graph.add_edges_from((u, v, {'distance': d, 'weight': w, 'index': i}) for i, (u, v, d, w) in enumerate(
+            zip(self.nodes[self.source].tolist(), self.nodes[self.indices].tolist(),
+                self.distance.tolist(), np.asarray(weight).tolist())))
+        return graph
+
+
+class Topology(CSRGraph):
+    """
+    Topological graph V, each node as a sector of the roadmap.
+    """
+    ARRAYS = CSRGraph.ARRAYS + ('capacity', 'degree')
+
+    def __init__(self, config):
+        """
+
+        :param config: list, each element as a dict of node, neighbor, distance and capacity.
+        """
+        super().__init__([node['node'] for node in config],
+                         [(node['node'], node['neighbor'][i], node['distance'][i])
+                          for node in config for i in range(len(node['neighbor']))])
+        self.capacity = np.array([node['capacity'] for node in config], dtype=float)
+
+        # Out-degree weighted by distance, the diagonal of the Laplacian
+        self.degree = np.bincount(self.source, weights=self.distance, minlength=len(self))
+
+    def laplacian(self):
+        """
+        Build the dense out-degree Laplacian weighted by distance.
+        :return: array, (N, N) Laplacian matrix.
+        """
+        laplacian = np.zeros((len(self), len(self)))
+        laplacian[self.source, self.indices] = -self.distance
+        laplacian[np.arange(len(self)), np.arange(len(self))] = self.degree
+        return laplacian
+
+
+class Consensus:
+    """
+    Consensus operator (1 + K * L) on the weights of the topology, 1 being the all-ones matrix.
+    Precomputed as a dense matrix for small topologies, otherwise applied through the edge rows of L.
+    """
+    DENSE_LIMIT = 512
+
+    def __init__(self, topology, K):
+        """
+
+        :param topology: Topology, graph V.
+        :param K: float, consensus gain.
+        """
+        self.__K = K
+        self.__topology = topology
+        self.__dense = None
+        if len(topology) <= self.DENSE_LIMIT:
+            self.__dense = (1 + K * topology.laplacian()).T
+        else:
+            # Edges other than self-loops, which only count on the diagonal
+            self.__edges = np.flatnonzero(topology.source != topology.indices)
+
+    def apply(self, weights):
+        """
+        Apply the operator on the weights of every window at once.
+        :param weights: array, (H, N) weight of each node of each window.
+        :return: array, (H, N) weight of each node after the consensus.
+        """
+        if self.__dense is not None:
+            return weights @ self.__dense
+
+        # L @ w = degree * w - sum of distance * w over the outgoing edges
+        topology, edges = self.__topology, self.__edges
+        flow = np.zeros((len(topology), len(weights)))
+        np.add.at(flow, topology.source[edges], (weights[:, topology.indices[edges]] * topology.distance[edges]).T)
+        return weights.sum(axis=1, keepdims=True) + self.__K * (topology.degree * weights - flow.T)
+
+
+class Roadmap(CSRGraph):
+    """
+    Roadmap graph G, each node as a slot hosted by a sector of the topology.
+    """
+    ARRAYS = CSRGraph.ARRAYS + ('position', 'host', 'crossing', 'grid')
+
+    def __init__(self, config, topology):
+        """
+
+        :param config: list, each element as a dict of node, position, neighbor and distance.
+        :param topology: Topology, hosting sectors.
+        """
+        super().__init__([node['node'] for node in config],
+                         [(node['node'], node['neighbor'][i], node['distance'][i])
+                          for node in config for i in range(len(node['neighbor']))])
+        self.position = np.array([node['position'] for node in config], dtype=np.int64)
+        self.host = np.array([topology.index[node // 100] for node in self.nodes.tolist()], dtype=np.int64)
+
+        # Edges crossing sectors
+        self.crossing = np.flatnonzero(self.host[self.source] != self.host[self.indices])
+
+        # Dense index of the first node at each x and y, -1 where there is none
+        cells, first = np.unique(self.position, axis=0, return_index=True)
+        self.grid = np.full(self.position.max(axis=0) + 1, -1, dtype=np.int64)
+        self.grid[cells[:, 0], cells[:, 1]] = first
+
+    def locate(self, x, y):
+        """
+        :param x: integer or array, x-axis value of each position.
+        :param y: integer or array, y-axis value of each position.
+        :return: integer or array, dense index of the node at each position, -1 where there is none.
+        """
+        x, y = np.asarray(x), np.asarray(y)
+        inside = (0 <= x) & (x < self.grid.shape[0]) & (0 <= y) & (y < self.grid.shape[1])
+        return np.where(inside, self.grid[np.where(inside, x, 0), np.where(inside, y, 0)], -1)
+
+
+def load(topology, roadmap, directory='graphs', cache=CACHE):
+    """
+    Import and compile topology and roadmap configuration.
+    The compiled arrays are saved into one file keyed by the content of both configuration files,
+    later loads memory-map it read-only so that processes loading the same graphs share its pages.
+    Older files of the same pair of configuration files are removed, and the graphs are only kept in memory
+    if the folder cannot be written.
+
+    :param topology: string, file name of the topology.
+    :param roadmap: string, file name of the roadmap.
+    :param directory: string, folder of the configuration files.
+    :param cache: string, folder of compiled graphs inside the directory, None to always compile.
+    :return: Topology and Roadmap.
+    """
+    with open(f"{directory}/{topology}", 'rb') as f:
+        topology_source = f.read()
+    with open(f"{directory}/{roadmap}", 'rb') as f:
+        roadmap_source = f.read()
+    if cache is None:
+        V = Topology(json.loads(topology_source))
+        return V, Roadmap(json.loads(roadmap_source), V)
+
+    digest = hashlib.sha1(COMPILED_FORMAT.to_bytes(8, 'little'))
+    for source in (topology_source, roadmap_source):
+        digest.update(len(source).to_bytes(8, 'little'))
+        digest.update(source)
+    prefix = f"{os.path.splitext(topology)[0]}.{os.path.splitext(roadmap)[0]}."
+    file_name = f"{prefix}{digest.hexdigest()}.npg"
+    path = f"{directory}/{cache}/{file_name}"
+
+    if not os.path.exists(path):
+        V = Topology(json.loads(topology_source))
+        G = Roadmap(json.loads(roadmap_source), V)
+        arrays = {f"V.{name}": array for name, array in V.to_arrays().items()}
+        arrays.update({f"G.{name}": array for name, array in G.to_arrays().items()})
+        try:
+            os.makedirs(f"{directory}/{cache}", exist_ok=True)
+            save_compiled(path, arrays)
+
+            # Drop the files left by earlier versions of the configuration files or of the format
+            for stale in os.listdir(f"{directory}/{cache}"):
+                if stale.startswith(prefix) and stale.endswith('.npg') and stale != file_name:
+                    os.remove(f"{directory}/{cache}/{stale}")
+        except OSError:
+            # Read-only checkout, use the graphs just compiled
+            if not os.path.exists(path):
+                return V, G
+
+    arrays = load_compiled(path)
+    return (Topology.from_arrays({name: arrays[f"V.{name}"] for name in Topology.ARRAYS}),
+            Roadmap.from_arrays({name: arrays[f"G.{name}"] for name in Roadmap.ARRAYS}))
+
+
+def save_compiled(path, arrays):
+    """
+    Write arrays into one file: the byte length of a JSON header, the header holding
+    the dtype, shape and offset of each array, then the data of each array aligned to 64 bytes.
+    The file is written aside and renamed, a concurrent process may be writing the same one.
+
+    :param path: string, file of the compiled arrays.
+    :param arrays: dict, each name as its array.
+    """
+    import tempfile
+
+    arrays = {name: np.ascontiguousarray(array) for name, array in arrays.items()}
+    layout, offset = dict(), 0
+    for name, array in arrays.items():
+        layout[name] = (array.dtype.str, array.shape, offset)
+        offset += -(-array.nbytes // 64) * 64
+    header = json.dumps(layout).encode()
+    start = -(-(8 + len(header)) // 64) * 64
+
+    descriptor, temporary = tempfile.mkstemp(dir=os.path.dirname(path))
+    with os.fdopen(descriptor, 'wb') as f:
+        f.write(len(header).to_bytes(8, 'little'))
+        f.write(header)
+        for name, array in arrays.items():
+            f.seek(start + layout[name][2])
+            f.write(array.tobytes())
+    os.chmod(temporary, 0o644)
+    os.replace(temporary, path)
+
+
+def load_compiled(path):
+    """
+    Memory-map the arrays written by save_compiled.
+    :param path: string, file of the compiled arrays.
+    :return: dict, each name as its read-only array.
+    """
+    buffer = np.memmap(path, dtype=np.uint8, mode='r')
+    size = int.from_bytes(bytes(buffer[:8]), 'little')
+    header = json.loads(bytes(buffer[8:8 + size]))
+    start = -(-(8 + size) // 64) * 64
+    arrays = dict()
+    for name, (dtype, shape, offset) in header.items():
+        dtype = np.dtype(dtype)
+        count = int(np.prod(shape, dtype=np.int64))
+        arrays[name] = buffer[start + offset:start + offset + count * dtype.itemsize].view(dtype).reshape(shape)
+    return arrays
+
+
+def dijkstra(graph, source, target, weight, blocked=frozenset(), allowed=None):
+    """
+    Find the shortest path from source to target, never stepping on blocked or disallowed nodes.
+    Ties are broken in the same order as networkx.dijkstra_path.
+
+    :param graph: CSRGraph, graph to search.
+    :param source: integer, dense index of the starting node.
+    :param target: integer, dense index of the end node.
+    :param weight: list, weight of each edge.
+    :param blocked: set, dense indices of nodes which cannot be visited.
+    :param allowed: list, whether each node may be visited, None if all.
+    :return: list, each element as dense index of node, None if there is no path.
+    """
+    indptr, indices = graph._indptr, graph._indices
+    dist = dict()
+    seen = {source: 0}
+    prev_node = {source: None}
+    heap = [(0, 0, source)]
+    count = 0
+    while heap:
+        d, _, v = heapq.heappop(heap)
+        if v in dist:
+            continue
+        dist[v] = d
+
+        # Found the target, trace back the path
+        if v == target:
+            path = [v]
+            while prev_node[path[-1]] is not None:
+                path.append(prev_node[path[-1]])
+            return path[::-1]
+
+        for e in range(indptr[v], indptr[v + 1]):
+            u = indices[e]
+            if u in dist or u in blocked or (allowed is not None and not allowed[u]):
+                continue
+            du = d + weight[e]
+            if u not in seen or du < seen[u]:
+                seen[u] = du
+                prev_node[u] = v
+                count += 1
+                heapq.heappush(heap, (du, count, u))
+
+    return None
+
+
+class ReverseTree:
+    """
+    Shortest-path tree toward a target, grown by expanding the incoming edges of each node
+    only until the node asked for is settled, a later query resuming the same search.
+    The next node of a settled node is final, so the tree is the same as one expanded at once.
+    """
+
+    def __init__(self, graph, target, weight, allowed=None):
+        """
+
+        :param graph: CSRGraph, graph to search.
+        :param target: integer, dense index of the root node.
+        :param weight: list, weight of each edge.
+        :param allowed: list, whether each edge may be used, None if all.
+        """
+        self.__graph = graph
+        self.__weight = weight
+        self.__allowed = allowed
+        self.__dist = [float('inf')] * len(graph)
+        self.__dist[target] = 0
+        self.__settled = [False] * len(graph)
+        self.__heap = [(0, 0, target)]
+        self.__count = 0
+        self.__next_node = [-1] * len(graph)
+        self.__next_node[target] = target
+
+    def reach(self, source):
+        """
+        Grow the tree until a node is settled or found unreachable.
+        :param source: integer, dense index of the node.
+        :return: list, dense index of the next node toward the target of each node, -1 if unreachable,
+            final on the route from every settled node.
+        """
+        rindptr, rindices, redges = self.__graph._rindptr, self.__graph._rindices, self.__graph._redges
+        weight, allowed, dist, settled = self.__weight, self.__allowed, self.__dist, self.__settled
+        next_node, heap, count = self.__next_node, self.__heap, self.__count
+        while heap and not settled[source]:
+            d, _, v = heapq.heappop(heap)
+            if settled[v]:
+                continue
+            settled[v] = True
+
+            for i in range(rindptr[v], rindptr[v + 1]):
+                u = rindices[i]
+                if settled[u] or (allowed is not None and not allowed[redges[i]]):
+                    continue
+                du = d + weight[redges[i]]
+                if du < dist[u]:
+                    dist[u] = du
+                    next_node[u] = v
+                    count += 1
+                    heapq.heappush(heap, (du, count, u))
+
+        self.__count = count
+        return next_node
@@ -8,7 +8,6 @@ class SceneSetup:
     HIERARCHY_POLICY = True
     num_pallet = 2
     ws_width, ws_height = 60, 8
-    workspace = np.zeros((ws_width, ws_height))
 
     workstation_index = {"Workstation 01": 0,
                          "Workstation 02": 1,
@@ -88,6 +87,98 @@ class SceneSetup:
     DEFAULT_FEED_Y = 3
 
 
+class Scene:
+    """
+    Workspace grid of one Controller.
+    The layout of walls, workstations and slots is built once and shared read-only by every scene,
+    while the occupation of the cells is private to each scene.
+    """
+    __shared_layout = None
+
+    def __init__(self):
+        if Scene.__shared_layout is None:
+            Scene.__shared_layout = Scene.__build_layout()
+        self.__layout = Scene.__shared_layout
+        self.__occupied = np.zeros(self.__layout.shape, dtype=np.int8)
+
+    @staticmethod
+    def __build_layout():
+        """
+        Build the layout from the Workspace configuration.
+        :return: array, (width, height) class of each cell, read-only.
+        """
+        layout = np.zeros((SceneSetup.ws_width, SceneSetup.ws_height))
+        for wall in SceneSetup.wall:
+            x, y, w, h = wall
+            layout[x:x + w, y:y + h] = SceneSetup.WALL
+        for ws in SceneSetup.workstation:
+            x, y, w, h = ws
+            layout[x:x + w, y:y + h] = SceneSetup.WORKSTATION
+
+        # Parking slots and queueing slots
+        for ps in SceneSetup.parking_slot:
+            x, y = ps
+            layout[x, y] = SceneSetup.PARK
+        for ws in SceneSetup.queueing_slot:
+            for qs in ws:
+                x, y = qs
+                layout[x, y] = SceneSetup.QUEUEING
+        layout.setflags(write=False)
+        return layout
+
+    def get_layout(self):
+        """
+        Get the layout shared by every scene, which must not be written.
+        :return: array, (width, height) class of each cell, as multiples of 10.
+        """
+        return self.__layout
+
+    def get_shape(self):
+        """
+        :return: integer x2, as the width and height of the workspace.
+        """
+        return self.__layout.shape
+
+    def get_grid(self):
+        """
+        Compose the layout and the occupation as in the original encoding,
+        the 2nd-to-last digit telling the class of the cell and the last digit whether it is occupied.
+        :return: array, (width, height) state of each cell.
+        """
+        return self.__layout + self.__occupied
+
+    def is_empty(self, x, y):
+        """
+        :param x: integer, x-axis value.
+        :param y: integer, y-axis value.
+        :return: boolean, True if no pallet occupies the cell.
+        """
+        return self.__occupied[x, y] == SceneSetup.EMPTY
+
+    def is_kind(self, x, y, kind):
+        """
+        :param x: integer, x-axis value.
+        :param y: integer, y-axis value.
+        :param kind: integer, class of cell in SceneSetup, e.g. SceneSetup.WALL.
+        :return: boolean, True if the cell is of the class.
+        """
+        return self.__layout[x, y] == kind
+
+    def set_occupied(self, x, y, occupied=True):
+        """
+        :param x: integer, x-axis value.
+        :param y: integer, y-axis value.
+        :param occupied: boolean, whether a pallet occupies the cell.
+        """
+        self.__occupied[x, y] = SceneSetup.OCCUPIED if occupied else SceneSetup.EMPTY
+
+    def clear(self):
+        """
+        Mark every cell empty.
+        """
+        self.__occupied.fill(SceneSetup.EMPTY)
+
+
 class Workstation:
     """
 
@@ -173,52 +264,53 @@ class Workstation:
 
 
 class Pallet:
-    def __init__(self, pallet_id, position):
+    """
+    View of one pallet in a Fleet, keeping only its ID and workstation aliases.
+    """
+
+    def __init__(self, pallet_id, fleet, row):
         """
 
-        :param pallet_id:
-        :param position:
+        :param pallet_id: string, ID of the pallet.
+        :param fleet: Fleet, holding the state of the pallet.
+        :param row: integer, row of the pallet in the fleet.
         """
         self.__pallet_id = pallet_id
+        self.__fleet = fleet
+        self.__row = row
         self.__carry = list()
-        self.__position = position
-        self.__path = list()
         self.__target = None
-        self.__goal = None
         self.__workstation = None
-        self.__history = [position]
-        self.__waited = 0
 
     def move(self):
         """
 
         :return:
         """
-        if len(self.__path) > 1:
-            if self.__position == self.__path[1]:
-                self.__waited += 1
-            else:
-                self.__waited = 0
-            self.__path.pop(0)
-            self.__position = self.__path[0]
-        self.__history.append(self.__position)
+        self.__fleet.move_all(np.array([self.__row]))
 
-    def get_history(self):
-        return self.__history[:]
+    def get_row(self):
+        return self.__row
+
+    def set_row(self, row):
+        """
+        :param row: integer, new row of the pallet after the fleet moved it.
+        """
+        self.__row = row
 
     def get_position(self):
         """
 
         :return:
         """
-        return self.__position + 0
+        return int(self.__fleet.position[self.__row])
 
     def get_path(self):
         """
 
         :return:
         """
-        return self.__path[:]
+        return self.__fleet.get_path(self.__row)
 
     def set_path(self, path):
         """
@@ -226,7 +318,7 @@ class Pallet:
         :param path:
         :return:
         """
-        self.__path = path[:]
+        self.__fleet.set_path(self.__row, path)
 
     def set_target(self, ws_name):
         """
@@ -242,7 +334,7 @@ class Pallet:
         :param node:
         :return:
         """
-        self.__goal = node + 0
+        self.__fleet.goal[self.__row] = node
 
     def get_goal(self):
         """
@@ -250,7 +342,8 @@ class Pallet:
         :param node:
         :return:
         """
-        return self.__goal + 0 if self.__goal is not None else None
+        goal = int(self.__fleet.goal[self.__row])
+        return goal if goal != Fleet.NONE else None
 
     def get_target(self):
         """
@@ -275,4 +368,409 @@ class Pallet:
         return self.__workstation[:] if self.__workstation is not None else None
 
     def get_waited(self):
-        return self.__waited + 0
+        return int(self.__fleet.waited[self.__row])
+
+
+class Fleet:
+    """
+    State of every pallet as arrays, one row per pallet in the order they were added,
+    the last row taking the place of a removed pallet.
+    The path of a pallet is its row of the padded path matrix from its cursor to its length,
+    the node at the cursor being the current position.
+    Arrays are allocated ahead and grow by doubling, so only the first len(fleet) rows are valid.
+    """
+    NONE = -1
+
+    def __init__(self, pallets=64, length=64, headroom=0):
+        """
+
+        :param pallets: integer, number of rows allocated at first.
+        :param length: integer, number of path columns allocated at first.
+        :param headroom: integer, number of spare columns left before each new path for the inserted waits.
+        """
+        self.__headroom = headroom
+        self.position = np.zeros(pallets, dtype=np.int64)
+        self.goal = np.full(pallets, self.NONE, dtype=np.int64)
+        self.waited = np.zeros(pallets, dtype=np.int64)
+        self.paths = np.zeros((pallets, headroom + length), dtype=np.int64)
+        self.cursor = np.zeros(pallets, dtype=np.int64)
+        self.length = np.zeros(pallets, dtype=np.int64)
+        self.__ids = []
+        self.__size = 0
+
+    def __len__(self):
+        return self.__size
+
+    def clear(self):
+        """
+        Remove every pallet, keeping the allocated arrays.
+        """
+        self.goal.fill(self.NONE)
+        self.waited.fill(0)
+        self.cursor.fill(0)
+        self.length.fill(0)
+        self.__ids = []
+        self.__size = 0
+
+    def add(self, pallet_id, position):
+        """
+        Add a pallet with an empty path.
+        :param pallet_id: string, ID of the pallet.
+        :param position: integer, ID of the current node in G.
+        :return: Pallet, view of the new row.
+        """
+        return self.add_all([pallet_id], [position])[0]
+
+    def add_all(self, pallet_ids, positions):
+        """
+        Add pallets with empty paths.
+        :param pallet_ids: list, ID of each pallet.
+        :param positions: array, ID of the current node in G of each pallet.
+        :return: list, Pallet view of each new row.
+        """
+        start, end = self.__size, self.__size + len(pallet_ids)
+        if end > len(self.position):
+            rows = max(2 * len(self.position), end) - len(self.position)
+            self.position = np.concatenate((self.position, np.zeros(rows, dtype=np.int64)))
+            self.goal = np.concatenate((self.goal, np.full(rows, self.NONE, dtype=np.int64)))
+            self.waited = np.concatenate((self.waited, np.zeros(rows, dtype=np.int64)))
+            self.paths = np.concatenate((self.paths, np.zeros((rows, self.paths.shape[1]), dtype=np.int64)))
+            self.cursor = np.concatenate((self.cursor, np.zeros(rows, dtype=np.int64)))
+            self.length = np.concatenate((self.length, np.zeros(rows, dtype=np.int64)))
+        self.position[start:end] = positions
+        self.__ids.extend(pallet_ids)
+        self.__size = end
+        return [Pallet(pallet_id, self, row) for row, pallet_id in enumerate(pallet_ids, start)]
+
+    def remove(self, row):
+        """
+        Remove a pallet, moving the last row into its place.
+        :param row: integer, row of the pallet.
+        :return: string, ID of the pallet moved into the row, None if the removed one was the last.
+        """
+        last = self.__size - 1
+        moved = None
+        if row != last:
+            for array in (self.position, self.goal, self.waited, self.paths, self.cursor, self.length):
+                array[row] = array[last]
+            self.__ids[row] = moved = self.__ids[last]
+        self.goal[last], self.waited[last], self.cursor[last], self.length[last] = self.NONE, 0, 0, 0
+        self.__ids.pop()
+        self.__size = last
+        return moved
+
+    def get_path(self, row):
+        """
+        :param row: integer, row of the pallet.
+        :return: list, each element as ID of node in G.
+        """
+        return self.paths[row, self.cursor[row]:self.length[row]].tolist()
+
+    def set_path(self, row, path):
+        """
+        :param row: integer, row of the pallet.
+        :param path: list, each element as ID of node in G, starting from the current position.
+        """
+        start = self.__headroom
+        self.__reserve(start + len(path))
+        self.paths[row, start:start + len(path)] = path
+        self.cursor[row], self.length[row] = start, start + len(path)
+
+    def get_node(self, row, offset):
+        """
+        :param row: integer, row of the pallet.
+        :param offset: integer, offset of the node from the cursor, within the path.
+        :return: integer, ID of node in G.
+        """
+        return int(self.paths[row, self.cursor[row] + offset])
+
+    def insert_wait(self, row, offset, count=1):
+        """
+        Stay at the node before the offset for count more steps, delaying the rest of the path.
+        The nodes before the offset are moved back into the columns already passed by the cursor,
+        so the cost does not depend on the length of the path unless the headroom left by set_path is used up.
+
+        :param row: integer, row of the pallet.
+        :param offset: integer, offset from the cursor of the first inserted step, at least 1.
+        :param count: integer, number of inserted steps.
+        """
+        cursor, length = self.cursor[row], self.length[row]
+        node = self.paths[row, cursor + offset - 1]
+        if cursor >= count:
+            self.paths[row, cursor - count:cursor - count + offset] = self.paths[row, cursor:cursor + offset]
+            self.cursor[row] = cursor - count
+        else:
+            self.__reserve(length + count)
+            self.paths[row, cursor + offset + count:length + count] = self.paths[row, cursor + offset:length]
+            self.length[row] = length + count
+        self.paths[row, self.cursor[row] + offset:self.cursor[row] + offset + count] = node
+
+    def splice(self, row, offset, path):
+        """
+        Replace the path from an offset onward.
+        :param row: integer, row of the pallet.
+        :param offset: integer, offset from the cursor of the first replaced node.
+        :param path: list, each element as ID of node in G.
+        """
+        start = self.cursor[row] + offset
+        self.__reserve(start + len(path))
+        self.paths[row, start:start + len(path)] = path
+        self.length[row] = start + len(path)
+
+    def __reserve(self, columns):
+        """
+        Grow the path matrix to hold at least the given number of columns.
+        :param columns: integer, number of columns needed.
+        """
+        if columns > self.paths.shape[1]:
+            grown = np.zeros((len(self.paths), max(2 * self.paths.shape[1], columns)), dtype=np.int64)
+            grown[:, :self.paths.shape[1]] = self.paths
+            self.paths = grown
+
+    def get_ids(self):
+        """
+        :return: list, ID of the pallet of each row.
+        """
+        return self.__ids
+
+    def get_positions(self):
+        """
+        :return: array, view of the ID of the current node in G of each pallet.
+        """
+        return self.position[:self.__size]
+
+    def get_goals(self):
+        """
+        :return: array, view of the ID of the goal node in G of each pallet, NONE if not set.
+        """
+        return self.goal[:self.__size]
+
+    def get_remaining(self):
+        """
+        :return: array, number of nodes left in the path of each pallet, including the current position.
+        """
+        return self.length[:self.__size] - self.cursor[:self.__size]
+
+    def get_nodes(self, offsets, rows=None):
+        """
+        Look up one node on the path of every pallet, the current position for empty paths.
+        :param offsets: array, (P, ...) offset of the node from the cursor of each pallet, within its path.
+        :param rows: array, rows of the pallets to look up, None for all.
+        :return: array, (P, ...) ID of node in G.
+        """
+        rows = np.arange(self.__size) if rows is None else np.asarray(rows)
+        shape = (len(rows),) + (1,) * (np.ndim(offsets) - 1)
+        columns = np.maximum(self.cursor[rows].reshape(shape) + offsets, 0)
+        empty = (self.length[rows] == self.cursor[rows]).reshape(shape)
+        return np.where(empty, self.position[rows].reshape(shape), self.paths[rows.reshape(shape), columns])
+
+    def get_steps(self, count, rows=None):
+        """
+        :param count: integer, number of steps.
+        :param rows: array, rows of the pallets to look up, None for all.
+        :return: array, (P, count) ID of the first nodes in G of the path of each pallet,
+            padded by staying at its end.
+        """
+        rows = np.arange(self.__size) if rows is None else np.asarray(rows)
+        remaining = self.length[rows] - self.cursor[rows]
+        offsets = np.minimum(np.arange(count)[None, :], np.maximum(remaining, 1)[:, None] - 1)
+        return self.get_nodes(offsets, rows)
+
+    def move_all(self, rows=None):
+        """
+        Move every pallet with a next node one step forward along its path.
+        A pallet staying at the same node counts one more step of waiting.
+        :param rows: array, rows of the pallets to move, None for all.
+        """
+        rows = np.arange(self.__size) if rows is None else rows
+        rows = rows[self.length[rows] - self.cursor[rows] > 1]
+        following = self.paths[rows, self.cursor[rows] + 1]
+        self.waited[rows] = np.where(self.position[rows] == following, self.waited[rows] + 1, 0)
+        self.cursor[rows] += 1
+        self.position[rows] = following
+
+
+class TimeWindow:
+    """
+    Predicted traffic over the current state and H future windows.
+    Row t of each array holds the window at future t (0 as the current state),
+    columns are the dense indices of nodes in G, nodes in V and edges in G.
+    """
+
+    def __init__(self, H, num_g, num_v, distance):
+        """
+
+        :param H: integer, number of future windows.
+        :param num_g: integer, number of nodes in G.
+        :param num_v: integer, number of nodes in V.
+        :param distance: array, distance of each edge in G.
+        """
+        self.occupied_g = np.zeros((H + 1, num_g), dtype=np.int32)
+        self.occupied_v = np.zeros((H + 1, num_v), dtype=np.int32)
+        self.weight_v = np.zeros((H + 1, num_v))
+        self.weight_g = np.tile(np.asarray(distance, dtype=float), (H + 1, 1))
+        self.__distance = distance
+
+    def clear(self):
+        """
+        Empty every window, the weights of G going back to the distances.
+        """
+        self.occupied_g.fill(0)
+        self.occupied_v.fill(0)
+        self.weight_v.fill(0.)
+        self.weight_g[:] = self.__distance
+
+    def add_path(self, steps, hosts, count=1):
+        """
+        Add the occupation of a path on windows 1, 2, ... H, relative to its current position.
+        A negative count removes a previously added path.
+
+        :param steps: array, dense indices of the first H + 1 nodes in G of the path.
+        :param hosts: array, dense indices of the hosting nodes in V of the steps.
+        :param count: integer, number of times the path is added.
+        """
+        rows = np.arange(1, len(steps))
+        self.occupied_g[rows, steps[1:]] += count
+        self.occupied_g[rows, steps[0]] -= count
+        self.occupied_v[rows, hosts[1:]] += count
+        self.occupied_v[rows, hosts[0]] -= count
+
+    def shift(self):
+        """
+        Take the 1st window as the current state.
+        """
+        self.occupied_g[0] = self.occupied_g[1]
+        self.occupied_v[0] = self.occupied_v[1]
+        self.weight_v[0] = self.weight_v[1]
+        self.weight_g[0] = self.weight_g[1]
+
+
+class History:
+    """
+    Preallocated record of the trajectory of every pallet and the occupation of every node in V.
+    Row t holds the state after t steps, columns of the trajectory are pallets in the order of the rows of the Fleet.
+    The rows grow by doubling, or only the last rows are kept in ring mode.
+    In ring mode each row is written twice, at t % length and t % length + length,
+    so the last rows always form one contiguous block and can be returned as views.
+    """
+
+    def __init__(self, num_v, length=None, pallets=64):
+        """
+
+        :param num_v: integer, number of nodes in V.
+        :param length: integer, number of rows kept in ring mode, None to keep every row.
+        :param pallets: integer, number of pallet columns allocated at first.
+        """
+        self.__ring = length
+        rows = 2 * length if length is not None else 1024
+        self.__trajectory = np.full((rows, pallets), -1, dtype=np.int32)
+        self.__occupied = np.zeros((rows, num_v), dtype=np.int32)
+        self.__first = []
+        self.__row = 0
+
+    def __slots(self, t):
+        """
+        :return: list, buffer rows storing row t.
+        """
+        if self.__ring is None:
+            return [t]
+        return [t % self.__ring, t % self.__ring + self.__ring]
+
+    def clear(self):
+        """
+        Forget every step and pallet, keeping the allocated buffers.
+        """
+        self.__trajectory.fill(-1)
+        self.__occupied.fill(0)
+        self.__first = []
+        self.__row = 0
+
+    def add_pallet(self, position):
+        """
+        Open the column of a new pallet at the current row.
+        :param position: integer, ID of the current node in G of the pallet.
+        :return: integer, column of the pallet.
+        """
+        return self.add_pallets([position])[0]
+
+    def add_pallets(self, positions):
+        """
+        Open the columns of new pallets at the current row.
+        :param positions: array, ID of the current node in G of each pallet.
+        :return: range, column of each pallet.
+        """
+        start, end = len(self.__first), len(self.__first) + len(positions)
+        columns = self.__trajectory.shape[1]
+        if end > columns:
+            grown = np.full((len(self.__trajectory), max(2 * columns, end)), -1, dtype=np.int32)
+            grown[:, :columns] = self.__trajectory
+            self.__trajectory = grown
+        self.__first.extend([self.__row] * len(positions))
+        for slot in self.__slots(self.__row):
+            self.__trajectory[slot, start:end] = positions
+        return range(start, end)
+
+    def remove_pallet(self, column):
+        """
+        Drop the track of a pallet, moving the last column into its place as the Fleet does with its rows.
+        :param column: integer, column of the pallet.
+        """
+        last = len(self.__first) - 1
+        self.__trajectory[:, column] = self.__trajectory[:, last]
+        self.__trajectory[:, last] = -1
+        self.__first[column] = self.__first[last]
+        self.__first.pop()
+
+    def record(self, positions, occupied):
+        """
+        Overwrite the current row with the current state.
+        :param positions: list, ID of the current node in G of each pallet, in the order of columns.
+        :param occupied: array, occupation of each node in V.
+        """
+        slots = self.__slots(self.__row)
+        self.__trajectory[slots, :len(positions)] = positions
+        self.__occupied[slots] = occupied
+
+    def step(self, positions, occupied):
+        """
+        Append the state after one step as a new row.
+        :param positions: list, ID of the current node in G of each pallet, in the order of columns.
+        :param occupied: array, occupation of each node in V.
+        """
+        self.__row += 1
+        if self.__ring is None and self.__row == len(self.__trajectory):
+            self.__trajectory = np.concatenate((self.__trajectory, np.full_like(self.__trajectory, -1)))
+            self.__occupied = np.concatenate((self.__occupied, np.zeros_like(self.__occupied)))
+        self.record(positions, occupied)
+
+    def __rows(self):
+        """
+        :return: slice, buffer rows of the kept steps in chronological order, and index of their first step.
+        """
+        end = self.__row + 1
+        if self.__ring is None:
+            return slice(0, end), 0
+        start = max(end - self.__ring, 0)
+        return slice(start % self.__ring, start % self.__ring + end - start), start
+
+    def get_trajectory(self):
+        """
+        :return: array, (T, P) view of the ID of node in G of each pallet at each kept step, -1 before it was added.
+        """
+        rows, _ = self.__rows()
+        return self.__trajectory[rows, :len(self.__first)]
+
+    def get_occupied(self):
+        """
+        :return: array, (T, |V|) view of the occupation of each node in V at each kept step.
+        """
+        rows, _ = self.__rows()
+        return self.__occupied[rows]
+
+    def get_tracks(self):
+        """
+        :return: list, view of the kept track of each pallet since it was added, in the order of columns.
+        """
+        trajectory = self.get_trajectory()
+        _, start = self.__rows()
+        return [trajectory[max(first - start, 0):, column] for column, first in enumerate(self.__first)]
@@ -0,0 +1,50 @@
+import matplotlib.pyplot as plt
+import numpy as np
+
+
+def history_plot(roadmap, tracks, steps):
+    """
+    Plot the Extended Graph, the roadmap stretched over the iterations, with the track of every pallet.
+
+    :param roadmap: array, (N, 2) x and y of each node in G.
+    :param tracks: list, (T, 2) x and y of a pallet at each step since it was added.
+    :param steps: integer, number of recorded steps.
+    """
+    ax = plt.figure().add_subplot(projection='3d')
+    ax.invert_yaxis()
+
+    # Plot a base map using the x and y axes.
+    ax.scatter(roadmap[:, 0].tolist(), roadmap[:, 1].tolist(), zs=0, zdir='z', label='roadmap', marker='.')
+
+    # Plot the tracks
+    for track in tracks:
+        x, y = track.T
+        z = np.arange(len(track))
+        ax.plot(x, y, z)
+
+    # Make legend, set axes limits and labels
+    ax.legend()
+    ax.set_xlim(0, 57)
+    ax.set_ylim(0, 7)
+    ax.set_zlim(0, steps)
+    ax.set_xlabel('X')
+    ax.set_ylabel('Y')
+    ax.set_zlabel('Iteration')
+    ax.set_box_aspect((58, 24, 30))
+
+    # Customize the view angle so it's easier to see that the scatter points lie
+    # on the plane y=0
+    ax.view_init(elev=10., azim=-30, roll=0)
+
+    plt.show()
+
+
+def time_histogram(result):
+    """
+    Plot the distribution of the computation time of the simulations.
+    :param result: list, computation time of each simulation in seconds.
+    """
+    plt.hist(result, bins=max(int(max(result) - min(result)), 1))
+    plt.ylabel('% run ended')
+    plt.xlabel('Time (s)')
+    plt.show()
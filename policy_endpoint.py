@@ -1,8 +1,7 @@
-from policy_repository import SceneSetup, Pallet, Workstation
+from policy_repository import SceneSetup, Scene, Pallet, Workstation
 from astar import astar
 import numpy as np
 import random
-import matplotlib as plt
 
 
 class Controller:
@@ -13,33 +12,60 @@ class Controller:
     or import the TCP client for interacting with actual models.
     """
 
-    def __init__(self):
+    def __init__(self, seed=None, rng=None):
         """
 
+        :param seed: integer, seed of the own random generator of the Controller, ignored if rng is given.
+        :param rng: random.Random or numpy Generator, source of all stochastic decisions,
+            a seeded reset giving a new stream of the same kind.
         """
-        self.__workspace = SceneSetup.workspace
-        for wall in SceneSetup.wall:
-            x, y, w, h = wall
-            self.__workspace[x:x + w, y:y + h] = SceneSetup.WALL
-        for ws in SceneSetup.workstation:
-            x, y, w, h = ws
-            self.__workspace[x:x + w, y:y + h] = SceneSetup.WORKSTATION
-        if SceneSetup.TRAFFIC_POLICY:
-            for ps in SceneSetup.parking_slot:
-                x, y = ps
-                self.__workspace[x, y] = SceneSetup.PARK
-            for ws in SceneSetup.queueing_slot:
-                for qs in ws:
-                    x, y = qs
-                    self.__workspace[x, y] = SceneSetup.QUEUEING
-            for rw in SceneSetup.roadway:
-                x, y, w, h = rw
-                self.__workspace[x:x + w, y:y + h] = SceneSetup.ROADWAY
+        self.__scene = Scene()
+        self.__random = rng if rng is not None else random.Random(seed)
+        self.__pallets = dict()
+        self.__workstations = dict()
+        self.__add_workstations()
+        self.__predict_window = dict()
+
+    def reset(self, pallets=(), seed=None):
+        """
+        Restore the initial state in place for a new episode, keeping the layout.
+
+        :param pallets: list, each element as initial x and y of a pallet, None for the default feeding position.
+        :param seed: integer, seed of a new random stream of the same kind as the current one,
+            None to keep drawing from the current one.
+        :return: list, ID of each added pallet.
+        """
+        if seed is not None:
+            self.__reseed(seed)
+        self.__scene.clear()
         self.__pallets = dict()
         self.__workstations = dict()
         self.__add_workstations()
         self.__predict_window = dict()
 
+        return self.add_pallets(pallets)
+
+    def __reseed(self, seed):
+        """
+        Replace the random stream by a new one of the same kind, e.g. the same bit generator of an injected
+        numpy Generator, so that runs drawing common random numbers stay comparable.
+        :param seed: integer, seed of the new stream.
+        """
+        if isinstance(self.__random, np.random.Generator):
+            self.__random = np.random.Generator(type(self.__random.bit_generator)(seed))
+        elif isinstance(self.__random, random.Random):
+            self.__random = type(self.__random)(seed)
+        else:
+            raise ValueError(f"Cannot reseed the injected random source {self.__random!r}, reset without a seed.")
+
+    def add_pallets(self, positions):
+        """
+        Add pallets one after another, as by add_pallet.
+        :param positions: list, each element as initial x and y of a pallet, None for the default feeding position.
+        :return: list, ID of each pallet.
+        """
+        return [self.add_pallet(*position) if position is not None else self.add_pallet() for position in positions]
+
     def add_pallet(self, pos_x=SceneSetup.DEFAULT_FEED_X, pos_y=SceneSetup.DEFAULT_FEED_Y):
         """
         Add a new pallet to the system with auto incremental ID indexing.
@@ -124,12 +150,12 @@ class Controller:
 
         # Find the current position and clear the table cell
         prev_x, prev_y = pallet.get_position()
-        self.__workspace[prev_x, prev_y] = (self.__workspace[prev_x, prev_y] // 10) * 10 + SceneSetup.EMPTY
+        self.__scene.set_occupied(prev_x, prev_y, False)
         pallet.move()
 
         # Get new position and update the table
         new_x, new_y = pallet.get_position()
-        self.__workspace[new_x, new_y] = (self.__workspace[new_x, new_y] // 10) * 10 + SceneSetup.OCCUPIED
+        self.__scene.set_occupied(new_x, new_y)
         if new_x != prev_x or new_y != prev_y:
             # Leave workstation
             if self.__is(prev_x, prev_y, 'WORKSTATION') and not self.__is(new_x, new_y, 'WORKSTATION'):
@@ -146,29 +172,29 @@ class Controller:
                 ws.set_state(Workstation.BUSY)
                 print(f"Pallet {pallet_id} enters Workstation {name}")
 
-        if len(pallet.get_path()) == 0 and random.random() < 0.08:
-            self.move_to_ws(pallet_id, random.choice(list(SceneSetup.workstation_index.keys())))
+        if len(pallet.get_path()) == 0 and self.__random.random() < 0.08:
+            self.move_to_ws(pallet_id, self.__random.choice(list(SceneSetup.workstation_index.keys())))
 
     def __is_empty(self, x, y):
         """
-        Check if the designated slot is empty, simply by checking the last digit.
+        Check if the designated slot is empty in the occupation layer of the scene.
 
         :param x: integer, x-axis value
         :param y: integer, y-axis value
         :return: boolean, True if the condition is match, False otherwise
         """
-        return self.__workspace[x, y] % 10 == SceneSetup.EMPTY
+        return self.__scene.is_empty(x, y)
 
     def __is(self, x, y, name):
         """
-        Check what kind of slot is the designated position, simply by checking the 2nd-to-last digit.
+        Check what kind of slot is the designated position in the layout of the scene.
 
         :param x: integer, x-axis value
         :param y: integer, y-axis value
         :param name: string, name of the block class
         :return: boolean, True if the condition is match, False otherwise
         """
-        return self.__workspace[x, y] // 10 * 10 == eval(f"SceneSetup.{name}")
+        return self.__scene.is_kind(x, y, getattr(SceneSetup, name))
 
     def __check_queue_available(self, ws_name, idx):
         """
@@ -192,7 +218,7 @@ class Controller:
     def __observe(self, pallet_id):
         """
         Check the environment around the pallet and alternate the path if necessary.
-        Final decision (w/ or w/o modifications) will be saved into the prediction window
+        Slots to insert ahead of the path (waits or detours, none if unchanged) will be saved into the prediction window
 
         :param pallet_id: string, ID of the pallet
         """
@@ -214,14 +240,14 @@ class Controller:
 
                         # If in middle roadway, continue moving
                         if cur_x > SceneSetup.roadway[0][0]:
-                            path = list([np.array([cur_x - 1, cur_y]),
-                                         np.array([cur_x - 1, new_y])]) + path
+                            slots = [np.array([cur_x - 1, cur_y]),
+                                     np.array([cur_x - 1, new_y])]
                         # If at the end of the road, stay still
                         else:
-                            path = list([np.array([cur_x, cur_y])]) + path
+                            slots = [np.array([cur_x, cur_y])]
 
                         # Update the prediction window
-                        self.__predict_window[pallet_id] = path
+                        self.__predict_window[pallet_id] = slots
 
                 # From 4th row to 3rd row
                 elif cur_y == SceneSetup.roadway[1][1]:
@@ -230,14 +256,14 @@ class Controller:
 
                         # If in middle roadway, continue moving
                         if cur_x < SceneSetup.roadway[1][0] + SceneSetup.roadway[1][2]:
-                            path = list([np.array([cur_x + 1, cur_y]),
-                                         np.array([cur_x + 1, new_y])]) + path
+                            slots = [np.array([cur_x + 1, cur_y]),
+                                     np.array([cur_x + 1, new_y])]
                         # If at the end of the road, stay still
                         else:
-                            path = list([np.array([cur_x, cur_y])]) + path
+                            slots = [np.array([cur_x, cur_y])]
 
                         # Update the prediction window
-                        self.__predict_window[pallet_id] = path
+                        self.__predict_window[pallet_id] = slots
 
                 # There should not be any errors here
                 else:
@@ -250,9 +276,9 @@ class Controller:
 
                 # Wait if the queue is not about moving and front slot is occupied
                 if not self.__is_empty(new_x, new_y) or not self.__check_queue_available(ws_name, queue_index):
-                    path = list([np.array([cur_x, cur_y])]) + path
+                    slots = [np.array([cur_x, cur_y])]
                     # Update the prediction window
-                    self.__predict_window[pallet_id] = path
+                    self.__predict_window[pallet_id] = slots
 
             # Moving from queueing slot into workstation
             elif self.__is(cur_x, cur_y, 'QUEUEING') and self.__is(new_x, new_y, 'WORKSTATION'):
@@ -260,9 +286,9 @@ class Controller:
 
                 # Wait if the Workstation is not demanding for a new pallet
                 if self.__workstations[ws_name].get_state() != Workstation.STARVE:
-                    path = list([np.array([cur_x, cur_y])]) + path
+                    slots = [np.array([cur_x, cur_y])]
                     # Update the prediction window
-                    self.__predict_window[pallet_id] = path
+                    self.__predict_window[pallet_id] = slots
 
             # Entering the roadway
             elif not self.__is(cur_x, cur_y, 'ROADWAY') and self.__is(new_x, new_y, 'ROADWAY'):
@@ -295,24 +321,24 @@ class Controller:
                         (cond_2 and sub_2 and not counter_2) or \
                         (cond_3 and sub_3 and not counter_3) or \
                         (cond_4 and sub_4 and not counter_4):
-                    path = list([np.array([cur_x, cur_y])]) + path
+                    slots = [np.array([cur_x, cur_y])]
                     # Update the prediction window
-                    self.__predict_window[pallet_id] = path
+                    self.__predict_window[pallet_id] = slots
                     print(f"Pallet {pallet_id} waits to enter the roadway")
 
             elif self.__is(cur_x, cur_y, 'WORKSTATION') and not self.__is(new_x, new_y, 'WORKSTATION'):
                 if not self.__is_empty(new_x, new_y):
-                    path = list([np.array([cur_x, cur_y])]) + path
+                    slots = [np.array([cur_x, cur_y])]
                     # Update the prediction window
-                    self.__predict_window[pallet_id] = path
+                    self.__predict_window[pallet_id] = slots
 
             # # Generic case
             # # TODO: check if there are other cases
             # else:
             #     if not self.__is_empty(new_x, new_y):
-            #         path = list([np.array([cur_x, cur_y])]) + path
+            #         slots = [np.array([cur_x, cur_y])]
             #         # Update the prediction window
-            #         self.__predict_window[pallet_id] = path
+            #         self.__predict_window[pallet_id] = slots
 
     def move_to_ws(self, pallet_id, ws_name):
         """
@@ -327,12 +353,11 @@ class Controller:
         self.generate_path(pallet_id, queue[-1][0], queue[-1][1])
         path = pallet.get_path()
 
-        for slot in reversed(queue[:-1]):
-            path = path + list([np.array(slot)])
-        path = path + list([np.array(self.__workstations[ws_name].get_entry())])
+        # Append the queue slots and the entry of the workstation
+        slots = [np.array(slot) for slot in reversed(queue[:-1])]
+        path.splice(len(path), slots + [np.array(self.__workstations[ws_name].get_entry())])
         # TODO: check if the path should be put in the prediction window instead
-        # Update new path and new target for the pallet
-        pallet.set_path(path)
+        # Update new target for the pallet
         pallet.set_target(ws_name)
 
     def generate_path(self, pallet_id, pos_x, pos_y):
@@ -349,19 +374,18 @@ class Controller:
 
         if SceneSetup.TRAFFIC_POLICY:
             path = list()
-            if self.__workspace[cur_x, cur_y] // 10 * 10 == SceneSetup.WORKSTATION:
+            if self.__scene.is_kind(cur_x, cur_y, SceneSetup.WORKSTATION):
                 path.append((cur_pos := self.__workstations[pallet.get_ws()].get_exit()))
                 cur_x, cur_y = cur_pos[0], cur_pos[1]
                 next_x, next_y = self.find_address(cur_x, cur_y)
-                path_to_roadway = astar(self.__workspace.copy(), (cur_x, cur_y), (next_x, next_y),
+                path_to_roadway = astar(self.__scene.get_layout(), (cur_x, cur_y), (next_x, next_y),
                                         wall=SceneSetup.WALL)
                 path = path + path_to_roadway[1:]
                 cur_x, cur_y = path[-1]
 
-            elif self.__workspace[cur_x, cur_y] // 10 * 10 in [SceneSetup.PARK,
-                                                               SceneSetup.QUEUEING] and 2 <= cur_y <= 5:
+            elif self.__scene.get_layout()[cur_x, cur_y] in [SceneSetup.PARK, SceneSetup.QUEUEING] and 2 <= cur_y <= 5:
                 next_x, next_y = self.find_address(cur_x, cur_y)
-                path_to_roadway = astar(self.__workspace.copy(), (cur_x, cur_y), (next_x, next_y),
+                path_to_roadway = astar(self.__scene.get_layout(), (cur_x, cur_y), (next_x, next_y),
                                         wall=SceneSetup.WALL)
                 path = path + path_to_roadway[1:]
                 cur_x, cur_y = path[-1]
@@ -370,14 +394,14 @@ class Controller:
                 next_x = cur_x - 1 if cur_y < 2 else cur_x + 1
                 path.append(np.array([next_x, cur_y]))
                 addr_x, addr_y = self.find_address(next_x, cur_y)
-                path_to_roadway = astar(self.__workspace.copy(), (next_x, cur_y), (addr_x, addr_y),
+                path_to_roadway = astar(self.__scene.get_layout(), (next_x, cur_y), (addr_x, addr_y),
                                         wall=SceneSetup.WALL)
                 path = path + path_to_roadway[1:]
                 cur_x, cur_y = path[-1]
 
             else:
                 addr_x, addr_y = self.find_address(cur_x, cur_y)
-                path_to_roadway = astar(self.__workspace.copy(), (cur_x, cur_y), (addr_x, addr_y),
+                path_to_roadway = astar(self.__scene.get_layout(), (cur_x, cur_y), (addr_x, addr_y),
                                         wall=SceneSetup.WALL)
                 path = path + path_to_roadway[1:]
                 cur_x, cur_y = path[-1]
@@ -394,7 +418,7 @@ class Controller:
                 # 1st turn
                 path.append(np.array([cur_x, opposite_y]))
                 # straight path
-                path_to_desired_address = astar(self.__workspace.copy(), (cur_x, opposite_y), (desired_x, opposite_y),
+                path_to_desired_address = astar(self.__scene.get_layout(), (cur_x, opposite_y), (desired_x, opposite_y),
                                                 wall=SceneSetup.WALL)
                 path = path + path_to_desired_address[1:]
                 # 2nd turn
@@ -403,7 +427,7 @@ class Controller:
             elif (cur_x < desired_x and cur_y == desired_y == SceneSetup.roadway[1][1]) or \
                     (cur_x > desired_x and cur_y == desired_y == SceneSetup.roadway[0][1]):
                 # straight path
-                path_to_desired_address = astar(self.__workspace.copy(), (cur_x, cur_y), (desired_x, desired_y),
+                path_to_desired_address = astar(self.__scene.get_layout(), (cur_x, cur_y), (desired_x, desired_y),
                                                 wall=SceneSetup.WALL)
                 path = path + path_to_desired_address[1:]
 
@@ -412,28 +436,28 @@ class Controller:
                 # crossing
                 path.append(np.array([cur_x, desired_y]))
                 # straight path
-                path_to_desired_address = astar(self.__workspace.copy(), (cur_x, desired_y), (desired_x, desired_y),
+                path_to_desired_address = astar(self.__scene.get_layout(), (cur_x, desired_y), (desired_x, desired_y),
                                                 wall=SceneSetup.WALL)
                 path = path + path_to_desired_address[1:]
 
             elif (cur_x > desired_x and cur_y < desired_y) or (cur_x < desired_x and cur_y > desired_y):
                 # L turn
                 # straight path
-                path_to_desired_address = astar(self.__workspace.copy(), (cur_x, cur_y), (desired_x, cur_y),
+                path_to_desired_address = astar(self.__scene.get_layout(), (cur_x, cur_y), (desired_x, cur_y),
                                                 wall=SceneSetup.WALL)
                 path = path + path_to_desired_address[1:]
                 # crossing
                 path.append(np.array([desired_x, desired_y]))
 
             cur_x, cur_y = path[-1]
-            path_to_goal = astar(self.__workspace.copy(), (cur_x, cur_y), (pos_x, pos_y),
+            path_to_goal = astar(self.__scene.get_layout(), (cur_x, cur_y), (pos_x, pos_y),
                                  wall=SceneSetup.WALL)
             path = path + path_to_goal[1:]
             self.__pallets[pallet_id].set_path(path)
 
         # Casual go-to-goal algorithm
         else:
-            path = astar(self.__workspace.copy(), (cur_x, cur_y), (pos_x, pos_y), wall=SceneSetup.WALL)
+            path = astar(self.__scene.get_layout(), (cur_x, cur_y), (pos_x, pos_y), wall=SceneSetup.WALL)
             # TODO: check if prediction window is needed
             self.__pallets[pallet_id].set_path(path[1:])
 
@@ -441,17 +465,20 @@ class Controller:
         """
 
         """
-        for pallet_id, pallet in self.__pallets.items():
-            self.__predict_window[pallet_id] = pallet.get_path()
+        for pallet_id in self.__pallets:
+            self.__predict_window[pallet_id] = list()
             self.__observe(pallet_id)
+        previous = dict()
         for pallet_id, pallet in self.__pallets.items():
-            pallet.set_path(self.__predict_window[pallet_id])
+            previous[pallet_id] = pallet.get_position()
+            pallet.get_path().insert(0, self.__predict_window[pallet_id])
             self.__move_pallet(pallet_id)
-        self.__sim_verify()
+        self.__sim_verify(previous)
 
-    def __sim_verify(self):
+    def __sim_verify(self, previous):
         """
 
+        :param previous: dict, each key as ID of pallet and value as its position before the move.
         """
         occupied = dict()
         for pallet_id, pallet in self.__pallets.items():
@@ -460,8 +487,8 @@ class Controller:
                 if not (pos - other).any():
                     import os
                     print(f"Collision at {pos.tolist()} between "
-                          f"{pallet_id} moving from {self.__predict_window[pallet_id][0]} "
-                          f"and {other_id} moving from {self.__predict_window[other_id][0]}")
+                          f"{pallet_id} moving from {previous[pallet_id].tolist()} "
+                          f"and {other_id} moving from {previous[other_id].tolist()}")
                     os.system("pause")
 
             occupied[pallet_id] = pos
@@ -472,21 +499,21 @@ class Controller:
         :param pallet_id:
         :return:
         """
-        return self.__pallets[pallet_id].get_path()
+        return self.__pallets[pallet_id].get_path().tolist()
 
     def get_ws_size(self):
         """
 
         :return:
         """
-        return self.__workspace.shape[0], self.__workspace.shape[1]
+        return self.__scene.get_shape()
 
     def get_workspace(self):
         """
 
         :return:
         """
-        return self.__workspace.tolist()
+        return self.__scene.get_grid().tolist()
 
     def get_all_pallets(self):
         """
@@ -8,7 +8,6 @@ class SceneSetup:
     TRAFFIC_POLICY = True
     num_pallet = 2
     ws_width, ws_height = 58, 8
-    workspace = np.zeros((ws_width, ws_height))
 
     workstation_index = {"pen1": 0,
                          "pen2": 1,
@@ -112,6 +111,100 @@ class SceneSetup:
     DEFAULT_FEED_Y = 3
 
 
+class Scene:
+    """
+    Workspace grid of one Controller.
+    The layout of walls, workstations and slots is built once and shared read-only by every scene,
+    while the occupation of the cells is private to each scene.
+    """
+    __shared_layout = None
+
+    def __init__(self):
+        if Scene.__shared_layout is None:
+            Scene.__shared_layout = Scene.__build_layout()
+        self.__layout = Scene.__shared_layout
+        self.__occupied = np.zeros(self.__layout.shape, dtype=np.int8)
+
+    @staticmethod
+    def __build_layout():
+        """
+        Build the layout from the Workspace configuration.
+        :return: array, (width, height) class of each cell, read-only.
+        """
+        layout = np.zeros((SceneSetup.ws_width, SceneSetup.ws_height))
+        for wall in SceneSetup.wall:
+            x, y, w, h = wall
+            layout[x:x + w, y:y + h] = SceneSetup.WALL
+        for ws in SceneSetup.workstation:
+            x, y, w, h = ws
+            layout[x:x + w, y:y + h] = SceneSetup.WORKSTATION
+        if SceneSetup.TRAFFIC_POLICY:
+            for ps in SceneSetup.parking_slot:
+                x, y = ps
+                layout[x, y] = SceneSetup.PARK
+            for ws in SceneSetup.queueing_slot:
+                for qs in ws:
+                    x, y = qs
+                    layout[x, y] = SceneSetup.QUEUEING
+            for rw in SceneSetup.roadway:
+                x, y, w, h = rw
+                layout[x:x + w, y:y + h] = SceneSetup.ROADWAY
+        layout.setflags(write=False)
+        return layout
+
+    def get_layout(self):
+        """
+        Get the layout shared by every scene, which must not be written.
+        :return: array, (width, height) class of each cell, as multiples of 10.
+        """
+        return self.__layout
+
+    def get_shape(self):
+        """
+        :return: integer x2, as the width and height of the workspace.
+        """
+        return self.__layout.shape
+
+    def get_grid(self):
+        """
+        Compose the layout and the occupation as in the original encoding,
+        the 2nd-to-last digit telling the class of the cell and the last digit whether it is occupied.
+        :return: array, (width, height) state of each cell.
+        """
+        return self.__layout + self.__occupied
+
+    def is_empty(self, x, y):
+        """
+        :param x: integer, x-axis value.
+        :param y: integer, y-axis value.
+        :return: boolean, True if no pallet occupies the cell.
+        """
+        return self.__occupied[x, y] == SceneSetup.EMPTY
+
+    def is_kind(self, x, y, kind):
+        """
+        :param x: integer, x-axis value.
+        :param y: integer, y-axis value.
+        :param kind: integer, class of cell in SceneSetup, e.g. SceneSetup.WALL.
+        :return: boolean, True if the cell is of the class.
+        """
+        return self.__layout[x, y] == kind
+
+    def set_occupied(self, x, y, occupied=True):
+        """
+        :param x: integer, x-axis value.
+        :param y: integer, y-axis value.
+        :param occupied: boolean, whether a pallet occupies the cell.
+        """
+        self.__occupied[x, y] = SceneSetup.OCCUPIED if occupied else SceneSetup.EMPTY
+
+    def clear(self):
+        """
+        Mark every cell empty.
+        """
+        self.__occupied.fill(SceneSetup.EMPTY)
+
+
 class Workstation:
     """
 
@@ -196,6 +289,82 @@ class Workstation:
             return False
 
 
+class Path:
+    """
+    Slots ahead of a pallet, read through a cursor instead of popping the head of a list.
+    Slots already passed by the cursor are reused by insertions at the front,
+    so waiting or detouring at the next step costs no copy of the rest of the path.
+    """
+    # Number of spare slots left before a new path for the first insertions
+    HEADROOM = 8
+
+    def __init__(self, slots=()):
+        """
+
+        :param slots: iterable, each element as x and y of a slot, the next slot first.
+        """
+        self.__slots = [None] * self.HEADROOM + list(slots)
+        self.__cursor = self.HEADROOM
+
+    def __len__(self):
+        return len(self.__slots) - self.__cursor
+
+    def __getitem__(self, index):
+        """
+
+        :param index: integer, offset from the cursor, negative counting from the end.
+        :return: array, x and y of the slot.
+        """
+        if index < 0:
+            index += len(self)
+        if not 0 <= index < len(self):
+            raise IndexError("Path index out of range.")
+        return self.__slots[self.__cursor + index]
+
+    def __iter__(self):
+        return iter(self.__slots[self.__cursor:])
+
+    def advance(self):
+        """
+        Pass the next slot.
+        :return: array, x and y of the passed slot.
+        """
+        slot = self.__slots[self.__cursor]
+        self.__cursor += 1
+        return slot
+
+    def insert(self, offset, slots):
+        """
+        Insert slots before an offset, e.g. the current slot at 0 to wait for one step.
+        :param offset: integer, offset from the cursor of the first inserted slot.
+        :param slots: list, each element as x and y of a slot.
+        """
+        count = len(slots)
+        if count <= self.__cursor:
+            # Move the slots before the offset back into the passed ones
+            start = self.__cursor - count
+            self.__slots[start:start + offset] = self.__slots[self.__cursor:self.__cursor + offset]
+            self.__slots[start + offset:start + offset + count] = slots
+            self.__cursor = start
+        else:
+            self.__slots[self.__cursor + offset:self.__cursor + offset] = slots
+
+    def splice(self, offset, slots):
+        """
+        Replace the slots from an offset onward.
+        :param offset: integer, offset from the cursor of the first replaced slot, len(self) to append.
+        :param slots: list, each element as x and y of a slot.
+        """
+        del self.__slots[self.__cursor + offset:]
+        self.__slots.extend(slots)
+
+    def tolist(self):
+        """
+        :return: list, each remaining slot.
+        """
+        return self.__slots[self.__cursor:]
+
+
 class Pallet:
     def __init__(self, pallet_id, position):
         """
@@ -206,7 +375,7 @@ class Pallet:
         self.__pallet_id = pallet_id
         self.__carry = list()
         self.__position = position
-        self.__path = list()
+        self.__path = Path()
         self.__target = None
         self.__workstation = None
 
@@ -216,7 +385,7 @@ class Pallet:
         :return:
         """
         if len(self.__path) > 0:
-            self.__position = self.__path.pop(0)
+            self.__position = self.__path.advance()
 
     def get_position(self):
         """
@@ -228,9 +397,9 @@ class Pallet:
     def get_path(self):
         """
 
-        :return:
+        :return: Path, remaining slots, shared with the pallet.
         """
-        return self.__path.copy()
+        return self.__path
 
     def get_motion(self):
         """
@@ -245,10 +414,10 @@ class Pallet:
     def set_path(self, path):
         """
 
-        :param path:
+        :param path: list, each element as x and y of a slot, the next slot first.
         :return:
         """
-        self.__path = path
+        self.__path = Path(path)
 
     def set_target(self, ws_name):
         """
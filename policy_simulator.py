@@ -346,8 +346,7 @@ class Simulator(QWidget):
         self.__end_timer()
         self.__show_time()
         self.pause_button.setText("Start")
-        del self.controller
-        self.controller = Controller()
+        self.controller.reset()
         for pallet in self.__pallets.values():
             self.white_board.removeItem(pallet)
         self.__pallets = dict()
@@ -0,0 +1,146 @@
+import time
+import numpy as np
+
+
+class StepProfiler:
+    """
+    Record the duration of each phase and the counters of each step of a Controller.
+    """
+    PHASES = ('history', 'planning', 'timewindow', 'coordination', 'movement', 'verification')
+    COUNTERS = ('searches', 'trees', 'replans', 'conflicts', 'passes')
+
+    def __init__(self):
+        self.__phase = {name: i for i, name in enumerate(self.PHASES)}
+        self.__counter = {name: i for i, name in enumerate(self.COUNTERS)}
+        self.__durations = []
+        self.__counts = []
+        self.__last = 0.
+
+    def start(self):
+        """
+        Open the record of a new step.
+        """
+        self.__durations.append([0.] * len(self.PHASES))
+        self.__counts.append([0] * len(self.COUNTERS))
+        self.__last = time.perf_counter()
+
+    def lap(self, phase):
+        """
+        Close a phase, lasting since the start of the step or the previous lap.
+        :param phase: string, name of the phase in PHASES.
+        """
+        now = time.perf_counter()
+        self.__durations[-1][self.__phase[phase]] += now - self.__last
+        self.__last = now
+
+    def count(self, counter, n=1):
+        """
+        Increase a counter of the current step, ignored before the first step.
+        :param counter: string, name of the counter in COUNTERS.
+        :param n: integer, increment.
+        """
+        if self.__counts:
+            self.__counts[-1][self.__counter[counter]] += n
+
+    def get_profile(self):
+        """
+        :return: dict, with
+            'phases': tuple, name of each column of durations,
+            'durations': array, (steps, phases) duration of each phase of each step in seconds,
+            'counters': tuple, name of each column of counts,
+            'counts': array, (steps, counters) value of each counter of each step.
+        """
+        return {'phases': self.PHASES,
+                'durations': np.array(self.__durations, dtype=float).reshape(-1, len(self.PHASES)),
+                'counters': self.COUNTERS,
+                'counts': np.array(self.__counts, dtype=np.int64).reshape(-1, len(self.COUNTERS))}
+
+
+class NullProfiler:
+    """
+    Stand-in of StepProfiler when profiling is disabled, every record being a no-op.
+    """
+
+    def start(self):
+        pass
+
+    def lap(self, phase):
+        pass
+
+    def count(self, counter, n=1):
+        pass
+
+    def get_profile(self):
+        return None
+
+
+class LatencyHistogram:
+    """
+    Histogram of latencies over logarithmic buckets of constant relative width, as in HDR histograms.
+    Histograms of the same layout merge by adding their counts, across runs and processes.
+    """
+    DEADLINE = 0.2  # Tick of the simulators, in seconds
+
+    def __init__(self, lowest=1e-6, highest=1e3, precision=0.01, deadline=DEADLINE):
+        """
+
+        :param lowest: float, smallest latency told apart in seconds, anything lower falls in the first bucket.
+        :param highest: float, largest latency told apart in seconds, anything higher falls in the last bucket.
+        :param precision: float, relative width of each bucket.
+        :param deadline: float, latency in seconds above which a step misses its deadline.
+        """
+        self.__layout = (lowest, highest, precision)
+        self.__lowest, self.__ratio = lowest, np.log1p(precision)
+        self.__counts = np.zeros(int(np.ceil(np.log(highest / lowest) / self.__ratio)) + 1, dtype=np.int64)
+        self.__deadline = deadline
+        self.__misses = 0
+        self.__max = 0.
+
+    def record(self, latencies):
+        """
+        :param latencies: float or array, latency of each step in seconds.
+        """
+        latencies = np.atleast_1d(np.asarray(latencies, dtype=float))
+        if len(latencies) == 0:
+            return
+        buckets = np.log(np.maximum(latencies, self.__lowest) / self.__lowest) / self.__ratio
+        np.add.at(self.__counts, np.minimum(buckets.astype(np.int64), len(self.__counts) - 1), 1)
+        self.__misses += int(np.count_nonzero(latencies > self.__deadline))
+        self.__max = max(self.__max, float(latencies.max()))
+
+    def merge(self, other):
+        """
+        Add the records of another histogram of the same layout and deadline.
+        :param other: LatencyHistogram.
+        :return: LatencyHistogram, self.
+        """
+        if other.__layout != self.__layout or other.__deadline != self.__deadline:
+            raise ValueError("Cannot merge latency histograms of different layouts or deadlines.")
+        self.__counts += other.__counts
+        self.__misses += other.__misses
+        self.__max = max(self.__max, other.__max)
+        return self
+
+    def get_count(self):
+        return int(self.__counts.sum())
+
+    def get_max(self):
+        return self.__max
+
+    def get_misses(self):
+        return self.__misses
+
+    def get_deadline(self):
+        return self.__deadline
+
+    def percentile(self, q):
+        """
+        :param q: float, percentile between 0 and 100.
+        :return: float, upper bound of the bucket holding the percentile, in seconds, never above the maximum.
+        """
+        count = self.get_count()
+        if count == 0:
+            return 0.
+        rank = max(int(np.ceil(q / 100 * count)), 1)
+        bucket = int(np.searchsorted(np.cumsum(self.__counts), rank))
+        return min(self.__lowest * np.exp((bucket + 1) * self.__ratio), self.__max)
@@ -340,7 +340,7 @@ class Simulator(QWidget):
                                                                'y'] * step / self.__animate_step + self.__padding),
                                               sz, sz)
 
-        log = self.controller.get_log()
+        log = self.controller.get_tracer().dump(('negotiation',), 16)
         self.status.setText(''.join([line + '\n' for line in log]))
 
         if step == self.__animate_step - 2:
@@ -423,8 +423,7 @@ class Simulator(QWidget):
         self.__end_timer()
         self.__show_time()
         self.pause_button.setText("Start")
-        del self.controller
-        self.controller = Controller()
+        self.controller.reset()
         for pallet in self.__pallets.values():
             self.white_board.removeItem(pallet)
         self.__pallets = dict()
@@ -0,0 +1,158 @@
+from profiler import LatencyHistogram
+import benchmark
+import hashlib
+import itertools
+import json
+import pickle
+import sqlite3
+import time
+
+GRID = {
+    'windows': [1, 2, 3],
+    'gain': [1., 10., 100.],
+    'pallet_num': [40, 80],
+    'roadmap': ['hex_roadmap4.json'],
+    'topology': ['hex_topology4.json'],
+    'origin': [True, False],
+}
+STORE = 'benchmark_results/sweep.sqlite'
+
+SCHEMA = '''
+CREATE TABLE IF NOT EXISTS config (
+    hash TEXT PRIMARY KEY,
+    windows INTEGER, gain REAL, pallet_num INTEGER, roadmap TEXT, topology TEXT, origin INTEGER,
+    num_iter INTEGER
+);
+CREATE TABLE IF NOT EXISTS seeds (
+    hash TEXT, base_seed INTEGER, num_sim INTEGER,
+    finished REAL,
+    PRIMARY KEY (hash, base_seed, num_sim)
+);
+CREATE TABLE IF NOT EXISTS run (
+    hash TEXT, seed INTEGER,
+    time REAL,
+    max_delay INTEGER, total_delay INTEGER, avg_delay REAL, robots INTEGER,
+    first_quart REAL, mean REAL, third_quart REAL, avg REAL,
+    p50 REAL, p95 REAL, p99 REAL, max_step REAL, misses INTEGER, latency BLOB,
+    PRIMARY KEY (hash, seed)
+);
+'''
+
+
+def config_hash(config, directory='graphs'):
+    """
+    Hash a configuration together with the content of its graph files,
+    so editing a roadmap or topology invalidates its results.
+    The seeds are not part of it, each run being stored by its own seed.
+
+    :param config: dict, parameters of benchmark.simulate with num_iter.
+    :param directory: string, folder of the configuration files.
+    :return: string, hex digest.
+    """
+    digest = hashlib.sha1(json.dumps(config, sort_keys=True).encode())
+    for name in (config['roadmap'], config['topology']):
+        with open(f"{directory}/{name}", 'rb') as f:
+            digest.update(f.read())
+    return digest.hexdigest()
+
+
+def open_store(path=STORE):
+    """
+    Open the results store, creating its tables if needed.
+    :param path: string, file of the SQLite database.
+    :return: Connection.
+    """
+    db = sqlite3.connect(path)
+    db.executescript(SCHEMA)
+    return db
+
+
+def sweep(grid=GRID, num_sim=benchmark.NUM_SIM, base_seed=0, store=STORE, processes=None):
+    """
+    Run every combination of the grid for the seeds whose results are not in the store yet.
+    Each run is saved as soon as it ends, so an interrupted or extended sweep only runs the missing seeds.
+
+    :param grid: dict, each key as parameter of benchmark.simulate and value as list of settings.
+    :param num_sim: integer, number of simulations of each combination.
+    :param base_seed: integer, seed of the first simulation, the others counting up from it.
+    :param store: string, file of the SQLite database.
+    :param processes: integer, number of worker processes, all cores if None.
+    :return: list, hash of each combination in the order of the grid.
+    """
+    db = open_store(store)
+    seeds = [base_seed + i for i in range(num_sim)]
+    hashes = []
+
+    for values in itertools.product(*grid.values()):
+        params = dict(zip(grid.keys(), values))
+        config = dict(params, num_iter=benchmark.NUM_ITER)
+        key = config_hash(config)
+        hashes.append(key)
+
+        # Only the seeds not run by an earlier sweep
+        done = {seed for seed, in db.execute('SELECT seed FROM run WHERE hash = ?', (key,))}
+        missing = [seed for seed in seeds if seed not in done]
+        if len(missing) == 0:
+            print(f"Skipped {params}, already in the store.")
+        else:
+            db.execute('INSERT OR IGNORE INTO config (hash, windows, gain, pallet_num, roadmap, topology, origin, '
+                       'num_iter) VALUES (?, ?, ?, ?, ?, ?, ?, ?)',
+                       (key, params['windows'], params['gain'], params['pallet_num'], params['roadmap'],
+                        params['topology'], params['origin'], config['num_iter']))
+            db.commit()
+            print(f"Running {params}, {len(missing)} of {num_sim} simulations...")
+            for seed, (elapsed, dl, occ, latency) in zip(missing,
+                                                         benchmark.run_parallel(missing, processes, **params)):
+                steps = (latency.percentile(50), latency.percentile(95), latency.percentile(99), latency.get_max(),
+                         latency.get_misses(), pickle.dumps(latency))
+                db.execute('INSERT INTO run VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)',
+                           (key, seed, elapsed, *dl, *occ, *steps))
+                db.commit()
+
+        # Record when the requested range of seeds was first complete
+        db.execute('INSERT OR IGNORE INTO seeds VALUES (?, ?, ?, ?)', (key, base_seed, num_sim, time.time()))
+        db.commit()
+
+    db.close()
+    return hashes
+
+
+def load(key, seeds=None, store=STORE):
+    """
+    Read back the results of one combination.
+    :param key: string, hash of the combination.
+    :param seeds: iterable, seeds of the runs to read, None for every stored run.
+    :param store: string, file of the SQLite database.
+    :return: dict, parameters of the combination and list of each metric over the runs, in the order of seeds,
+        'latency' being the LatencyHistogram of each run, every list empty if the combination has no run yet.
+    """
+    db = open_store(store)
+    db.row_factory = sqlite3.Row
+    config = db.execute('SELECT * FROM config WHERE hash = ?', (key,)).fetchone()
+    if config is None:
+        db.close()
+        raise KeyError(f"No combination {key} in {store}.")
+    config = dict(config)
+    cursor = db.execute('SELECT * FROM run WHERE hash = ? ORDER BY seed', (key,))
+    columns = [description[0] for description in cursor.description]
+    runs = [dict(row) for row in cursor]
+    db.close()
+    if seeds is not None:
+        seeds = set(seeds)
+        runs = [run for run in runs if run['seed'] in seeds]
+    config.update({column: [run[column] for run in runs] for column in columns if column != 'hash'})
+    config['latency'] = [pickle.loads(latency) for latency in config['latency']]
+    return config
+
+
+if __name__ == '__main__':
+    for key in sweep():
+        res = load(key, range(benchmark.NUM_SIM))
+        dl_summary = list(zip(res['max_delay'], res['total_delay'], res['avg_delay'], res['robots']))
+        occ_summary = {name: res[name] for name in ('first_quart', 'mean', 'third_quart', 'avg')}
+        latency = LatencyHistogram()
+        for steps in res['latency']:
+            latency.merge(steps)
+        print(benchmark.summarize(res['time'], dl_summary, occ_summary, res['pallet_num'], res['windows'],
+                                  res['gain'], res['roadmap'], res['topology'],
+                                  'Origin.' if res['origin'] else 'Using Consensus.', latency))
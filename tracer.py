@@ -0,0 +1,134 @@
+import numpy as np
+
+
+class Tracer:
+    """
+    Structured trace of a Controller, kept in memory as a ring buffer of fixed-size binary records.
+    Only the event code and its arguments are stored, the message is formatted when the trace is dumped.
+    Each event belongs to a category, events of disabled categories are dropped at once.
+    """
+    # Category and message of each event, formatted with the step, the integer arguments a0 to a3,
+    # the same arguments as strings s0 to s3 if they were given as strings, and the value
+    EVENTS = {
+        'update': ('update', "###### Started update round {step} ######"),
+        'sector': ('sector', "NodeV {a0}: {a1} occupied, {value}"),
+        'order': ('order', "Received new order for pallet {s0} going to workstation {s1}."),
+        'route': ('route', "Generated path for pallet {s0} going from node {a1} to node {a2}, {a3} nodes long."),
+        'reroute': ('route', "Generated path for pallet {s0} going from node {a1} to node {a2} excluding node {a3}."),
+        'stuck': ('route', "Pallet {s0} staying in {a1} due to no sufficient path to {a2}."),
+        'blocked': ('route', "Pallet {s0} has to go through occupied sectors due to no sufficient path to {a2}."),
+        'lot': ('conflict', "Collision at NodeG {a0} time T+{a1}, {a2} pallets in conflict."),
+        'transition': ('conflict', "Transition conflict between pallet {s0} and {s1} at time T+{a2}."),
+        'negotiation': ('negotiation', "Negotiating among {a1} pallets: {s0} won."),
+        'collision': ('collision', "Collision at NodeG {a0}."),
+    }
+    CATEGORIES = ('update', 'sector', 'order', 'route', 'conflict', 'negotiation', 'collision')
+    DEFAULT = ('update', 'order', 'route', 'conflict', 'negotiation', 'collision')
+    RECORD = np.dtype([('step', np.int64), ('event', np.int16), ('args', np.int64, 4), ('value', np.float64)])
+
+    def __init__(self, categories=DEFAULT, capacity=4096):
+        """
+
+        :param categories: iterable, name of each enabled category in CATEGORIES.
+        :param capacity: integer, number of last records kept.
+        """
+        self.__events = list(self.EVENTS)
+        self.__code = {event: i for i, event in enumerate(self.__events)}
+        self.__enabled = dict.fromkeys(self.EVENTS, False)
+        for category in categories:
+            self.enable(category)
+        self.__buffer = np.zeros(capacity, dtype=self.RECORD)
+        self.__count = 0
+        self.__step = 0
+
+        # Strings given as arguments, stored by their index
+        self.__strings = []
+        self.__string_index = dict()
+
+    def enable(self, category, enabled=True):
+        """
+        :param category: string, name of the category in CATEGORIES.
+        :param enabled: boolean, whether the events of the category are recorded.
+        """
+        if category not in self.CATEGORIES:
+            raise ValueError(f"Unknown trace category {category}.")
+        for event, (event_category, _) in self.EVENTS.items():
+            if event_category == category:
+                self.__enabled[event] = enabled
+
+    def is_enabled(self, category):
+        """
+        :param category: string, name of the category in CATEGORIES.
+        :return: boolean, True if the events of the category are recorded.
+        """
+        return any(self.__enabled[event] for event, (event_category, _) in self.EVENTS.items()
+                   if event_category == category)
+
+    def step(self):
+        """
+        Start the records of a new step.
+        """
+        self.__step += 1
+        self.trace('update')
+
+    def trace(self, event, *args, value=0.):
+        """
+        Record an event if its category is enabled.
+        :param event: string, name of the event in EVENTS.
+        :param args: integer or string, up to 4 arguments of the event, None as -1.
+        :param value: float, value of the event.
+        """
+        if not self.__enabled[event]:
+            return
+        packed = [-1] * 4
+        for i, arg in enumerate(args):
+            if isinstance(arg, str):
+                if arg not in self.__string_index:
+                    self.__string_index[arg] = len(self.__strings)
+                    self.__strings.append(arg)
+                arg = self.__string_index[arg]
+            packed[i] = -1 if arg is None else arg
+        self.__buffer[self.__count % len(self.__buffer)] = (self.__step, self.__code[event], packed, value)
+        self.__count += 1
+
+    def clear(self):
+        """
+        Drop every record and restart from step 0.
+        """
+        self.__count = 0
+        self.__step = 0
+
+    def get_records(self):
+        """
+        :return: array, RECORD of each kept event in chronological order.
+        """
+        capacity = len(self.__buffer)
+        if self.__count <= capacity:
+            return self.__buffer[:self.__count].copy()
+        return np.roll(self.__buffer, -(self.__count % capacity))
+
+    def dump(self, categories=None, last=None, file=None):
+        """
+        Format the kept events.
+        :param categories: iterable, name of each category to include, all if None.
+        :param last: integer, number of last events included, all if None.
+        :param file: file, where each line is also written if given.
+        :return: list, message of each event.
+        """
+        records = self.get_records()
+        if categories is not None:
+            codes = [self.__code[event] for event, (category, _) in self.EVENTS.items() if category in categories]
+            records = records[np.isin(records['event'], codes)]
+        if last is not None:
+            records = records[len(records) - min(last, len(records)):]
+
+        lines = []
+        for step, code, args, value in records.tolist():
+            fields = {'step': step, 'value': value}
+            for i, arg in enumerate(args):
+                fields[f"a{i}"] = arg
+                fields[f"s{i}"] = self.__strings[arg] if 0 <= arg < len(self.__strings) else 'None'
+            lines.append(self.EVENTS[self.__events[code]][1].format(**fields))
+        if file is not None:
+            file.writelines(line + '\n' for line in lines)
+        return lines